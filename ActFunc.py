@@ -1,5 +1,7 @@
 import math
 import numpy as np
+try: import numba # optional: used to compile fused kernels for the commonest activation functions
+except ImportError: numba = None
 
 class ActFunc(object):
     # override these for derived classes
@@ -9,6 +11,18 @@ class ActFunc(object):
     def phi_prime(a): return None # calculate derivatives phi'(z) directly from activations a
     sigma = None # calculate sigma for initialising weights (best choice depends on the activation function)
 
+    # fused in-place versions of the above used by layers (to avoid allocating and passing over arrays again); override these with
+    # faster versions for derived classes where possible
+    @classmethod
+    def phi_ip(cls, z, b=None): # add biases b (if given, along last axis) to weighted inputs z then apply phi, overwriting z; returns a
+        if b is not None: z += b
+        z[...] = cls.phi(z)
+        return z
+    @classmethod
+    def dz_ip(cls, da, a): # calculate cost derivatives wrt weighted inputs from those wrt activations da, overwriting da; returns dz
+        da *= cls.phi_prime(a)
+        return da
+
     # weight initialisation functions
     @staticmethod
     def _He(n): return math.sqrt(2.0 / n)
@@ -21,6 +35,18 @@ class Sigmoid(ActFunc): # sigmoid activation function
     @staticmethod
     def phi_prime(a): return a * (1 - a) # phi'(z) = phi(z)(1 - phi(z)) = a(1 - a)
     sigma = ActFunc._Xavier
+    @staticmethod
+    def phi_ip(z, b=None):
+        if b is not None: z += b
+        np.negative(z, out=z)
+        np.exp(z, out=z)
+        z += 1
+        return np.reciprocal(z, out=z)
+    @staticmethod
+    def dz_ip(da, a):
+        da *= a
+        da *= 1 - a
+        return da
 
 class Tanh(ActFunc): # Tanh activation function
     @staticmethod
@@ -28,31 +54,97 @@ class Tanh(ActFunc): # Tanh activation function
     @staticmethod
     def phi_prime(a): return 1 - a * a
     sigma = ActFunc._Xavier
+    @staticmethod
+    def phi_ip(z, b=None):
+        if b is not None: z += b
+        return np.tanh(z, out=z)
+    @staticmethod
+    def dz_ip(da, a):
+        t = a * a
+        np.subtract(1, t, out=t) # 1 - a^2
+        da *= t
+        return da
 
 class Relu(ActFunc): # ReLU activation function
     @staticmethod
     def phi(z): return np.where(z < 0, 0, z)
     @staticmethod
-    def phi_prime(a): return np.where(a < 0, 0, 1)
+    def phi_prime(a): return np.where(a > 0, 1, 0).astype(a.dtype) # (a is never negative, so test for a > 0, ie z > 0)
     sigma = ActFunc._He
+    @staticmethod
+    def phi_ip(z, b=None):
+        if _Fusable(z, b): _BiasLeakyRelu(z.reshape(-1, b.size), b.reshape(-1), 0.0)
+        else:
+            if b is not None: z += b
+            np.maximum(z, 0, out=z)
+        return z
+    @staticmethod
+    def dz_ip(da, a):
+        if _Fusable(da, a): _DzRelu(da.reshape(-1), a.reshape(-1))
+        else: np.multiply(da, a > 0, out=da)
+        return da
 
 class LeakyRelu(ActFunc): # Leaky ReLU activation function
-    alpha = 0.01 # leak parameter (non-negative)
+    alpha = 0.01 # leak parameter (in [0, 1])
     @staticmethod
     def phi(z): return np.where(z < 0, LeakyRelu.alpha * z, z)
     @staticmethod
-    def phi_prime(a): return np.where(a < 0, LeakyRelu.alpha, 1)
+    def phi_prime(a): return np.where(a < 0, LeakyRelu.alpha, 1).astype(a.dtype)
     sigma = ActFunc._He
+    @staticmethod
+    def phi_ip(z, b=None):
+        if _Fusable(z, b): _BiasLeakyRelu(z.reshape(-1, b.size), b.reshape(-1), LeakyRelu.alpha)
+        else:
+            if b is not None: z += b
+            np.maximum(z, z * LeakyRelu.alpha, out=z) # (alpha * z > z only where z < 0)
+        return z
+    @staticmethod
+    def dz_ip(da, a):
+        if _Fusable(da, a): _DzLeakyRelu(da.reshape(-1), a.reshape(-1), LeakyRelu.alpha)
+        else: da *= np.take(np.array([1, LeakyRelu.alpha], da.dtype), (a < 0).view(np.uint8)) # look up derivatives from mask
+        return da
 
 class Softmax(ActFunc): # Softmax activation function (not for general use--used to implement Softmax output layer)
     @staticmethod
-    def phi(z): 
-        terms = np.exp(z) # calculate e^z terms
-        row_sums = np.sum(terms, 1).reshape(terms.shape[0], 1) # calculate sums of these terms for each input in the mini-batch (ie sum along rows)
-        return np.divide(terms, row_sums) # calculate softmax values (divide terms by sum per input row)
+    def phi(z): return Softmax.phi_ip(np.array(z, np.result_type(z, np.float32))) # (on a copy, stable for any logits)
     @staticmethod
     def phi_prime(a): return None # dummy function that is never called
     sigma = ActFunc._Xavier
+    @staticmethod
+    def phi_ip(z, b=None):
+        if b is not None: z += b
+        z -= np.max(z, 1, keepdims=True) # shift each row so its largest term is e^0 (softmax is unchanged, and exp can't overflow)
+        np.exp(z, out=z)
+        z /= np.sum(z, 1, keepdims=True)
+        return z
+    @staticmethod
+    def log_phi_ip(z, b=None): # calculates log-softmax in place (z - max - ln(sum(e^(z - max))), so can't overflow); returns z
+        if b is not None: z += b
+        z -= np.max(z, 1, keepdims=True)
+        z -= np.log(np.sum(np.exp(z), 1, keepdims=True))
+        return z
+
+def _Fusable(x, y): # whether the compiled kernels can be used for in-place operation on x (with y)
+    return numba != None and y is not None and x.flags.c_contiguous and y.flags.c_contiguous
+
+# compiled kernels (if numba is available): each is a single pass over memory
+if numba != None:
+    @numba.njit(cache=True)
+    def _BiasLeakyRelu(z, b, alpha): # add biases b to rows of z and apply leaky relu (relu if alpha = 0), in place
+        for i in range(z.shape[0]):
+            for j in range(z.shape[1]):
+                v = z[i, j] + b[j]
+                z[i, j] = v if v > 0 else alpha * v
+
+    @numba.njit(cache=True)
+    def _DzRelu(da, a): # multiply da by relu derivative (from activations a), in place
+        for i in range(da.shape[0]):
+            if a[i] <= 0: da[i] = 0
+
+    @numba.njit(cache=True)
+    def _DzLeakyRelu(da, a, alpha): # multiply da by leaky relu derivative (from activations a), in place
+        for i in range(da.shape[0]):
+            if a[i] < 0: da[i] *= alpha
 
 # maps between json labels and activation function classes
 map_from_json = { 
@@ -0,0 +1,49 @@
+import numpy as np
+
+# applies random augmentations to a whole batch of images (N, H, W) or (N, H, W, C) with a single gather; every combination of
+# shift, flip and rotation is precomputed as an index map (taking each output pixel to its source pixel), so augmenting a batch
+# is just picking a map per image and gathering through it
+class Augmenter():
+    # shape: image shape (H, W); max_shift: maximum shift (pixels) along each axis; wrap: shifted pixels wrap around (like np.roll)
+    # rather than being filled with 0 (like padding then cropping); flip: random horizontal flips; max_angle: maximum rotation
+    # (degrees) with num_angles rotations evenly spaced in [-max_angle, max_angle]; noise: standard deviation of added gaussian noise
+    def __init__(self, shape, max_shift=1, wrap=True, flip=False, max_angle=0, num_angles=5, noise=0):
+        self._shape = tuple(shape[:2]) # store image shape
+        self._noise = noise # store noise level
+        shifts = range(-max_shift, max_shift + 1) # possible shifts along each axis
+        angles = np.linspace(-max_angle, max_angle, num_angles) if max_angle != 0 else [0] # possible rotations
+        maps = [Augmenter._BuildMap(self._shape, dy, dx, wrap, f, a) for dy in shifts for dx in shifts for f in (False, True)[:1+flip] for a in angles]
+        self._idx = np.array([idx for idx, _ in maps]) # index maps for all transforms, shape (T, H*W)
+        self._valid = np.array([valid for _, valid in maps]) # masks of output pixels that have a source pixel, shape (T, H*W)
+        if self._valid.all(): self._valid = None # no masking required
+
+    def Augment(self, X, rng): # augments batch of images X using numpy random generator rng; returns augmented batch
+        shape, dtype = X.shape, X.dtype
+        num = shape[0]
+        t = rng.integers(0, self._idx.shape[0], num) # pick a transform for each image
+        X = X.reshape(num, self._idx.shape[1], -1) # flatten images (keeping any channels)
+        X = X[np.arange(num)[:, None], self._idx[t]] # gather every image through its transform's index map
+        if self._valid is not None: X *= self._valid[t][:, :, None] # zero pixels without a source pixel
+        if self._noise != 0: # add noise (clipped to range of integer data)
+            X = X + rng.normal(0, self._noise, X.shape)
+            if np.issubdtype(dtype, np.integer): X = np.clip(np.rint(X), np.iinfo(dtype).min, np.iinfo(dtype).max)
+            X = X.astype(dtype)
+        return X.reshape(shape) # restore image shape
+
+    # builds index map (and mask of valid output pixels) for a transform: output pixel (r, c) is taken from the input pixel got by
+    # undoing the shift (dy, dx), then the rotation (angle), then the flip; rotations use the nearest pixel
+    @staticmethod
+    def _BuildMap(shape, dy, dx, wrap, flip, angle):
+        h, w = shape
+        r, c = np.mgrid[0:h, 0:w] # output pixel coordinates
+        r, c = r - dy, c - dx # undo shift
+        if wrap: r, c = r % h, c % w
+        if angle != 0: # undo rotation (about image centre)
+            theta = np.deg2rad(angle)
+            yc, xc = r - (h - 1) / 2, c - (w - 1) / 2
+            r = np.rint(np.cos(theta) * yc - np.sin(theta) * xc + (h - 1) / 2).astype(int)
+            c = np.rint(np.sin(theta) * yc + np.cos(theta) * xc + (w - 1) / 2).astype(int)
+        if flip: c = w - 1 - c # undo flip
+        valid = (r >= 0) & (r < h) & (c >= 0) & (c < w) # output pixels with a source pixel
+        idx = np.clip(r, 0, h - 1) * w + np.clip(c, 0, w - 1) # flat source pixel indices
+        return idx.reshape(-1), valid.reshape(-1)
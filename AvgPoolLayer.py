@@ -0,0 +1,47 @@
+import numpy as np
+from collections import OrderedDict
+from Layer import Layer
+from PoolLayer import PoolLayer
+
+class AvgPoolLayer(PoolLayer): # 2D average pool layer of neurons; padding is excluded from the averages
+    def __init__(self, p_shape, prev, stride=None, padding=0, dilation=1):
+        super().__init__(p_shape, prev, stride, padding, dilation) # call base initialiser
+        self._scale = (1 / self._count).astype(self._dtype) # reciprocal of number of input pixels in each pool
+
+    def _CalcActivations(self, x, tr_flag): # calculate activations; tr_flag specifies whether training or not
+        x = np.reshape(x, (x.shape[0],) + self._prev._shape) # unravel input images
+        a = np.zeros((x.shape[0],) + self._shape, x.dtype) # sum of each pool
+        for _, xv, av in self._Views(x, a): av += xv # visit each pool position, adding to sums
+        a *= self._scale # get averages
+        return np.reshape(a, (x.shape[0], -1)) # return activations
+
+    # calculates cost derivative wrt inputs and passes this back through the network to adjust previous layers
+    def BackProp(self, da):
+        da = np.reshape(da, (da.shape[0],) + self._shape) * self._scale # unravel da completely and share it between pool inputs
+        dx = np.zeros((da.shape[0],) + self._prev._shape, da.dtype) # dx = 0
+        for _, dxv, dav in self._Views(dx, da): dxv += dav # visit each pool position, adding to dx
+        self._prev.BackProp(np.reshape(dx, (da.shape[0], -1))) # back-propagate cost derivative wrt to inputs (= activations of previous layer)
+
+    @staticmethod
+    def Deserialise(json_data, prev): # create average pool layer from json layer data
+        return AvgPoolLayer(json_data['p_shape'], prev, json_data.get('stride'), json_data.get('padding', 0), json_data.get('dilation', 1))
+
+class GlobalAvgPoolLayer(Layer): # averages each channel of input over the whole image (eg to replace large fully connected layers)
+    def __init__(self, prev):
+        super().__init__((1, 1, prev._shape[-1]), None, prev) # call base initialiser
+
+    def _CalcActivations(self, x, tr_flag): # calculate activations; tr_flag specifies whether training or not
+        return np.mean(np.reshape(x, (x.shape[0], -1, self._shape[-1])), 1) # average (input) channels over image
+
+    # calculates cost derivative wrt inputs and passes this back through the network to adjust previous layers
+    def BackProp(self, da):
+        n = self._prev._size // self._shape[-1] # number of pixels in image
+        dx = np.broadcast_to(da[:, None, :] / n, (da.shape[0], n, self._shape[-1])) # share da between pixels
+        self._prev.BackProp(np.reshape(dx, (da.shape[0], -1))) # back-propagate cost derivative wrt to inputs (= activations of previous layer)
+
+    def Serialise(self, with_weights=True): return OrderedDict() # convert layer to json data (ie a dict)
+
+    @staticmethod
+    def Deserialise(json_data, prev): return GlobalAvgPoolLayer(prev) # create global average pool layer from json layer data
+
+    def ToText(self): return 'shape={}'.format(self._shape) # convert layer attributes to display text
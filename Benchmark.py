@@ -0,0 +1,182 @@
+import sys
+import json
+import time
+import platform
+import argparse
+from collections import OrderedDict
+import numpy as np
+from Network import Network
+from Inference import InferencePlan
+from DataLoader import DataLoader
+from HyperParameters import HyperParameters
+import ConvEngine
+import Threads
+import Main
+from projects.Mnist.Mnist import Mnist
+
+# benchmark suite, run from the command line: forward and backward passes of each layer type (and convolution engine) over a grid
+# of shapes, batch sizes and dtypes; training and inference throughput of the reference network (Main.mnist_net_str); and
+# data pipeline throughput; all on synthetic MNIST-shaped data from fixed seeds; each result is the median time per call over
+# several repeats (each long enough to time reliably); results are saved as json, and can be compared against a saved baseline,
+# flagging any benchmark whose throughput has dropped by more than a threshold (exit status 1 if any have)
+#
+#   python Benchmark.py --out results.json                              run all suites and save results
+#   python Benchmark.py --suites layers --filter conv --quick           run subset (quick uses a smaller grid)
+#   python Benchmark.py --baseline base.json --out results.json         run, save and compare against baseline
+#   python Benchmark.py --baseline base.json --results results.json     compare saved results against baseline
+
+# layer grid: (layer type, input shape, json layer data)
+_layers = [
+    ('conv', (28, 28, 1), { 'f_shape': [5, 5], 'depth': 16, 'act_func': 'leaky_relu' }),
+    ('conv', (12, 12, 16), { 'f_shape': [5, 5], 'depth': 32, 'act_func': 'leaky_relu' }),
+    ('conv', (32, 32, 3), { 'f_shape': [3, 3], 'depth': 32, 'act_func': 'relu', 'padding': 'same' }),
+    ('maxpool', (24, 24, 16), { 'p_shape': [2, 2] }),
+    ('maxpool', (8, 8, 32), { 'p_shape': [2, 2] }),
+    ('maxpool', (32, 32, 32), { 'p_shape': [3, 3], 'stride': 2 }),
+    ('full_con', (512,), { 'size': 200, 'act_func': 'leaky_relu' }),
+    ('full_con', (200,), { 'size': 100, 'act_func': 'leaky_relu' }),
+    ('softmax_output', (100,), { 'size': 10 })]
+_batch_sizes, _dtypes = (16, 64, 256), ('float32', 'float64')
+
+def Run(suites, filter=None, quick=False): # runs benchmarks in given suites (whose names contain filter, if given); returns results
+    results = OrderedDict()
+    for suite in suites:
+        for name, fn, num in _suites[suite](quick): # (benchmarks are generated lazily, so only selected ones are set up)
+            if filter != None and filter not in name: continue
+            secs = _Time(*fn())
+            results[name] = OrderedDict([('secs', secs), ('samples_per_sec', num / secs)])
+            print('{:<72}{:>12.3f} ms{:>14,.0f} samples/s'.format(name, secs * 1000, num / secs))
+    return OrderedDict([('meta', _Meta()), ('results', results)])
+
+def Compare(results, baseline, threshold=0.1): # prints comparison of results against baseline; returns names of regressed benchmarks
+    regressed = []
+    print('{:<72}{:>14}{:>14}{:>9}'.format('benchmark', 'baseline', 'samples/s', 'change'))
+    for name, res in results['results'].items():
+        base = baseline['results'].get(name)
+        if base == None: continue
+        change = res['samples_per_sec'] / base['samples_per_sec'] - 1
+        flag = change < -threshold
+        if flag: regressed.append(name)
+        print('{:<72}{:>14,.0f}{:>14,.0f}{:>+9.1%}{}'.format(name, base['samples_per_sec'], res['samples_per_sec'], change,
+            '  REGRESSION' if flag else ''))
+    print('{} regression(s) (threshold {:.0%})'.format(len(regressed), threshold))
+    return regressed
+
+# times fn (calling setup, untimed, before every call if given); returns median seconds per call over repeats, each of enough calls
+# to last at least min_secs
+def _Time(fn, setup=None, repeats=5, min_secs=0.05):
+    def Timed(number):
+        total = 0.0
+        for _ in range(number):
+            if setup != None: setup()
+            start = time.perf_counter()
+            fn()
+            total += time.perf_counter() - start
+        return total
+    number = max(1, int(min_secs / max(Timed(1), 1e-9))) # (first call also warms up)
+    return float(np.median([Timed(number) / number for _ in range(repeats)]))
+
+def _Meta(): # returns description of benchmark environment
+    return OrderedDict([('time', time.strftime('%Y-%m-%d %H:%M:%S')), ('python', platform.python_version()), ('numpy', np.__version__),
+        ('platform', platform.platform()), ('processor', platform.processor()), ('threads', Threads.NumThreads())])
+
+def _LayerBenchmarks(quick): # yields (name, setup function, samples per call) for forward and backward pass of each layer in grid
+    for layer_type, in_shape, layer_data in _layers[::3] if quick else _layers:
+        algos = [a for a, cls in ConvEngine.map_from_json.items() if cls.Supports(*_Geometry(layer_data))] if layer_type == 'conv' else [None]
+        for algo in algos:
+            for num in (64,) if quick else _batch_sizes:
+                for dtype in ('float32',) if quick else _dtypes:
+                    shape = 'x'.join(str(s) for s in in_shape) + ''.join('-{}{}'.format(k, 'x'.join(str(s) for s in np.ravel(v)))
+                        for k, v in layer_data.items() if k != 'act_func')
+                    name = 'layer/{}{}/{}/b{}/{}'.format(layer_type, '' if algo == None else '-' + algo, shape, num, dtype)
+                    data = dict(layer_data, **({} if algo == None else { 'algo': algo }))
+                    yield name + '/forward', _LayerSetup(layer_type, in_shape, data, num, dtype, False), num
+                    yield name + '/backward', _LayerSetup(layer_type, in_shape, data, num, dtype, True), num
+
+def _Geometry(layer_data): # returns (stride, padding, dilation) of conv layer data (for checking engine support)
+    dilation, padding = ConvEngine.Pair(layer_data.get('dilation', 1)), layer_data.get('padding', 0)
+    if padding == 'same': padding = tuple(np.multiply(dilation, np.subtract(layer_data['f_shape'], 1)) // 2)
+    return ConvEngine.Pair(layer_data.get('stride', 1)), tuple(int(p) for p in ConvEngine.Pair(padding)), dilation
+
+# returns function that sets up layer of given type (after an input layer) and a mini-batch; the function returns (fn, setup) timing
+# the layer's forward pass, or its backward pass (with a forward pass, untimed, before each)
+def _LayerSetup(layer_type, in_shape, layer_data, num, dtype, backward):
+    def Setup():
+        net_data = { 'dtype': dtype, 'network': [{ 'layer': 'input', 'shape': list(in_shape) }, dict(layer_data, layer=layer_type)] }
+        net = Network(json_str=json.dumps(net_data))
+        layer, rng = net._last_layer, np.random.default_rng(0)
+        x = rng.standard_normal((num, layer._prev._size)).astype(dtype)
+        da = rng.standard_normal((num, layer._size)).astype(dtype)
+        forward = lambda: layer._CalcActivations(x, True)
+        if not backward: return (forward,)
+        if layer._w == None: return (lambda: layer.BackProp(da), forward) # pooling layers back-propagate directly (to input layer)
+        return (lambda: layer._CalcDerivatives(da, x, False), forward)
+    return Setup
+
+def _NetworkBenchmarks(quick): # yields benchmarks of training and inference throughput of reference network
+    for dtype in ('float32',) if quick else _dtypes:
+        def Bench(mode, num, dtype=dtype): # returns setup function for given mode
+            def Setup():
+                net, rng = Network(json_str=Main.mnist_net_str, dtype=dtype), np.random.default_rng(0)
+                X, y = rng.random((num, net._first_layer._size)).astype(dtype), rng.integers(0, 10, num)
+                if mode == 'train':
+                    net.PrepareTraining()
+                    return (lambda: net.Train(X, y, HyperParameters(batch_size=num)),)
+                if mode == 'feedforward': return (lambda: net.FeedForward(X),)
+                plan = InferencePlan(net, num)
+                return (lambda: plan.PredictProba(X),)
+            return Setup
+        yield 'network/mnist/train/b64/{}'.format(dtype), Bench('train', 64), 64
+        yield 'network/mnist/feedforward/b256/{}'.format(dtype), Bench('feedforward', 256), 256
+        yield 'network/mnist/plan/b256/{}'.format(dtype), Bench('plan', 256), 256
+        if not quick: yield 'network/mnist/plan/b1/{}'.format(dtype), Bench('plan', 1), 1
+
+def _DataBenchmarks(quick): # yields benchmarks of data pipeline (mini-batches, and whole epochs through a DataLoader)
+    num = 10000 if quick else 60000
+    def Dataset(): # synthetic MNIST-shaped dataset
+        rng = np.random.default_rng(0)
+        ds = Mnist(rng.integers(0, 256, (num, 28, 28), np.uint8), rng.integers(0, 10, num).astype(np.uint8), seed=0)
+        ds.dtype = np.dtype(np.float32)
+        ds.Shuffle()
+        return ds
+    def Batch(expand):
+        def Setup():
+            ds, starts = Dataset(), iter(range(0, 10**12, 64))
+            return (lambda: ds.BuildMiniBatch(next(starts) % (num - 64), 64, expand),)
+        return Setup
+    def Epoch(num_workers):
+        def Setup():
+            ds, params = Dataset(), HyperParameters(batch_size=64)
+            def Run():
+                with DataLoader(ds, params, 0, num_workers) as loader:
+                    for _ in loader: pass
+            return (Run,)
+        return Setup
+    yield 'data/mnist/batch/b64', Batch(False), 64
+    yield 'data/mnist/batch/b64/expand', Batch(True), 64
+    for num_workers in (0, 2, 4):
+        yield 'data/mnist/epoch/b64/expand/workers{}'.format(num_workers), Epoch(num_workers), num
+
+_suites = OrderedDict([('layers', _LayerBenchmarks), ('network', _NetworkBenchmarks), ('data', _DataBenchmarks)]) # benchmark suites
+
+if '__main__' == __name__:
+    parser = argparse.ArgumentParser(description='Benchmark layers, networks and data pipeline')
+    parser.add_argument('--suites', nargs='+', choices=list(_suites), default=list(_suites), help='suites to run (default all)')
+    parser.add_argument('--filter', help='only run benchmarks whose names contain this')
+    parser.add_argument('--quick', action='store_true', help='use a smaller grid')
+    parser.add_argument('--out', help='save results to this json file')
+    parser.add_argument('--results', help='load results from this json file (instead of running benchmarks)')
+    parser.add_argument('--baseline', help='compare results against baseline json file')
+    parser.add_argument('--threads', type=int, default=1, help='threads for intra-op parallelism (see Threads)')
+    parser.add_argument('--threshold', type=float, default=0.1, help='fractional drop in throughput flagged as a regression')
+    args = parser.parse_args()
+
+    Threads.SetNumThreads(args.threads)
+    if args.results != None:
+        with open(args.results) as f: results = json.load(f)
+    else: results = Run(args.suites, args.filter, args.quick)
+    if args.out != None:
+        with open(args.out, 'w') as f: json.dump(results, f, indent=1)
+    if args.baseline != None:
+        with open(args.baseline) as f: baseline = json.load(f)
+        sys.exit(1 if Compare(results, baseline, args.threshold) else 0)
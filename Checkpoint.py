@@ -0,0 +1,95 @@
+import os
+import json
+import time
+import queue
+import random
+import threading
+import numpy as np
+from collections import OrderedDict
+from Network import Network
+from HyperParameters import HyperParameters
+
+# checkpoint file format: a .npz file holding all arrays of the training state, plus json metadata (network architecture, position
+# in training, hyper-parameters, optimizer and random number generator states) stored as a string array under 'meta'
+
+class Checkpointer(): # periodically takes snapshots of the complete training state and writes them to file in a background thread
+    def __init__(self, fn, every_batches=None, every_secs=None):
+        self._fn = fn # store checkpoint file name
+        self._every_batches, self._every_secs = every_batches, every_secs # store checkpoint frequency (either or both may be used)
+        self._num_batches, self._sw_start = 0, time.monotonic() # number of batches and start time since last checkpoint
+        self._queue = queue.Queue(maxsize=1) # holds snapshot waiting to be written (at most one)
+        self._busy = threading.Event() # set while a snapshot is queued or being written
+        self._error = None # exception raised by background writer (re-raised on training thread)
+        self._thread = threading.Thread(target=self._Writer, daemon=True) # start background writer
+        self._thread.start()
+
+    # called after each mini-batch (epoch and start identify the next mini-batch); takes a checkpoint if one is due
+    def Update(self, net, ds, params, epoch, start):
+        self._num_batches += 1 # count mini-batch
+        due = (self._every_batches != None and self._num_batches >= self._every_batches) or \
+            (self._every_secs != None and time.monotonic() - self._sw_start >= self._every_secs)
+        if due: self.Save(net, ds, params, epoch, start)
+
+    # takes snapshot of training state and queues it for writing; raises any exception from writing a previous snapshot
+    def Save(self, net, ds, params, epoch, start):
+        if self._error != None: raise self._error
+        if self._busy.is_set(): return # skip snapshot if previous one is still being written (don't stall training)
+        self._busy.set()
+        self._queue.put(Snapshot(net, ds, params, epoch, start)) # snapshot on training thread (copies); write in background
+        self._num_batches, self._sw_start = 0, time.monotonic() # restart checkpoint interval
+
+    # waits for any pending checkpoint to be written, then stops background writer; raises any exception from writing a snapshot
+    def Close(self):
+        if self._thread.is_alive(): # (writer exits early if writing fails)
+            self._queue.put(None)
+            self._thread.join()
+        if self._error != None: raise self._error
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.Close()
+
+    def _Writer(self): # background thread; writes snapshots to file (until requested to exit, or writing fails)
+        try:
+            while True:
+                snapshot = self._queue.get() # wait for next snapshot
+                if snapshot == None: break # exit if requested
+                Write(self._fn, snapshot)
+                self._busy.clear()
+        except Exception as e: self._error = e # store exception (raised by next Save or Close)
+
+def Snapshot(net, ds, params, epoch, start): # takes snapshot (copies) of complete training state; returns (meta, arrays)
+    state = net.GetTrainState() # get weights and biases, accumulated cost derivatives and optimizer state
+    ds_state = ds.GetState() # get dataset order and random number generator state
+    np_state = np.random.get_state() # get numpy random number generator state
+    meta = OrderedDict([('network', net.Serialise(False)), ('epoch', epoch), ('start', start), ('params', params._asdict()),
+        ('num_grads', state['num_grads']), ('num_accum', state['num_accum']), ('optimizer', state['optimizer']), ('opt_t', state['opt_t']),
+        ('num_opt_state', len(state['opt_state'])),
+        ('ds_state', { key: val for key, val in ds_state.items() if key != 'order' }), # dataset state (except order)
+        ('random_state', random.getstate()), ('np_random_state', [np_state[0]] + list(np_state[2:]))])
+    arrays = OrderedDict([('values', state['values']), ('grad', state['grad']), ('np_random_keys', np_state[1])])
+    if ds_state['order'] is not None: arrays['order'] = ds_state['order'] # add dataset order (if shuffled)
+    arrays.update(('opt_{}'.format(i), s) for i, s in enumerate(state['opt_state'])) # add optimizer state arrays
+    return meta, arrays
+
+def Write(fn, snapshot): # writes snapshot to checkpoint file atomically (via temporary file)
+    meta, arrays = snapshot
+    fn_tmp = fn + '.tmp' # write to temporary file first
+    with open(fn_tmp, 'wb') as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), **arrays) # write arrays and metadata
+        f.flush()
+        os.fsync(f.fileno()) # make sure data is on disk before replacing checkpoint
+    os.replace(fn_tmp, fn) # replace old checkpoint (atomic)
+
+def Resume(fn, ds): # restores training state from checkpoint file; returns network, hyper-parameters, epoch and start of next mini-batch
+    with np.load(fn) as f:
+        meta = json.loads(str(f['meta'])) # read metadata
+        arrays = { key: f[key] for key in f.files if key != 'meta' } # read arrays
+    net = Network(json_str=json.dumps(meta['network'])) # create network
+    net.SetTrainState({ 'values': arrays['values'], 'grad': arrays['grad'], 'num_grads': meta['num_grads'], 'num_accum': meta['num_accum'],
+        'optimizer': meta['optimizer'], 'opt_t': meta['opt_t'], 'opt_state': [arrays['opt_{}'.format(i)] for i in range(meta['num_opt_state'])]})
+    ds.SetState(dict(meta['ds_state'], order=arrays.get('order'))) # restore dataset order and random number generator state
+    random.setstate((meta['random_state'][0], tuple(meta['random_state'][1]), meta['random_state'][2])) # restore random number generators
+    np.random.set_state((meta['np_random_state'][0], arrays['np_random_keys']) + tuple(meta['np_random_state'][1:]))
+    epoch, start = meta['epoch'], meta['start']
+    if start >= ds.num: epoch, start = epoch + 1, 0 # checkpoint was taken at end of epoch so resume with next one
+    return net, HyperParameters(**meta['params']), epoch, start
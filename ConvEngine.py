@@ -0,0 +1,185 @@
+import time
+import functools
+import numpy as np
+
+# convolution engines; each implements the forward and backward passes of a 2D convolutional layer for inputs of shape in_shape
+# (H, W, C) (flattened, channels last) and a bank of depth filters of shape f_shape (weights of shape (C, fh*fw, depth)); the filters
+# are applied with the given stride, (zero) padding on each side and dilation (all pairs)
+class ConvEngine(): # abstract class for convolution engines
+    def __init__(self, in_shape, f_shape, depth, stride=(1,1), padding=(0,0), dilation=(1,1)):
+        self._in_shape, self._f_shape, self._depth = tuple(in_shape), tuple(f_shape), depth # store input, filter shapes and depth
+        self._stride, self._padding, self._dilation = tuple(stride), tuple(padding), tuple(dilation) # store filter geometry
+        self._out_shape = ConvShape(self._in_shape[:-1], self._f_shape, stride, padding, dilation) # store (2D) shape of output
+        self._col2im = Col2ImSlices(self._in_shape[:-1], self._f_shape, self._stride, self._padding, self._dilation) # store slices for col2im
+
+    @staticmethod
+    def Supports(stride, padding, dilation): return True # whether engine supports given filter geometry
+
+    # override these for derived classes
+    def Forward(self, x, w, tr_flag): return None # returns weighted inputs z (without biases) for inputs x; caches what Backward needs if training
+    def Backward(self, dz, w, no_dx): return (None, None, None) # returns cost derivatives wrt weights, biases and inputs (dx optional)
+
+    # calculates cost derivatives wrt inputs (col2im): for each filter position, the output pixels' dz's times that position's weights are
+    # added into the (strided) view of dx the filter position covered, so there's no padded copy of dz or batch-sized im2col temporary
+    def _Col2Im(self, dz, w):
+        dz = np.reshape(dz, (-1,) + self._out_shape + (w.shape[2],)) # unravel dz completely
+        num = dz.shape[0]
+        dx = np.zeros((num,) + self._in_shape, dz.dtype) # dx = 0
+        for k, (dst, src) in enumerate(self._col2im): 
+            if dst != None: dx[(slice(None),) + dst] += dz[(slice(None),) + src] @ w[:, k].T # add filter position's share of dx
+        return np.reshape(dx, (num, -1)) # shape dx to mini-batch
+
+# im2col engine with input channels folded into the columns, so the forward pass and dw are each a single GEMM over the mini-batch;
+# padding is handled by the gather indices (padded positions are gathered from pixel 0 then masked to 0), so nothing is ever padded
+class GemmEngine(ConvEngine):
+    def __init__(self, in_shape, f_shape, depth, stride=(1,1), padding=(0,0), dilation=(1,1)):
+        super().__init__(in_shape, f_shape, depth, stride, padding, dilation) # call base initialiser
+        # build index (and mask of valid positions) for faster forward pass
+        self._i2cidx_fwd, self._valid_fwd = BuildIdx(self._in_shape[:-1], self._f_shape, self._stride, self._padding, self._dilation) 
+
+    def Forward(self, x, w, tr_flag):
+        num, c = x.shape[0], self._in_shape[-1]
+        cols = np.reshape(x, (num, -1, c))[:, self._i2cidx_fwd] # apply im2col transform to input x (channels last), shape (N, P, F, C)
+        if self._valid_fwd is not None: cols *= self._valid_fwd[:, :, None] # zero padding
+        cols = np.reshape(cols, (-1, cols.shape[2] * c)) # fold filter positions and input channels into columns (no copy)
+        self._cols = cols if tr_flag else None # cache columns, if training
+        z = cols @ np.reshape(np.transpose(w, (1, 0, 2)), (cols.shape[1], -1)) # calculate weighted inputs (weights reordered to match columns)
+        return np.reshape(z, (num, -1)) # shape to mini-batch
+
+    def Backward(self, dz, w, no_dx):
+        num, (c, f, d) = dz.shape[0], w.shape
+        dz = np.reshape(dz, (-1, d)) # unravel layer channels from dz (rows for all output pixels in mini-batch)
+        db = np.sum(dz, 0) / num # sum dz's (within each layer channel) and average over mini-batch to get db
+        dw = np.transpose(np.reshape(self._cols.T @ dz, (f, c, d)), (1, 0, 2)) / num # calculate dw (summing over mini-batch in GEMM)
+        self._cols = None # clear this because it's big and no longer needed
+
+        dx = None if no_dx else self._Col2Im(dz, w) # calculate cost derivatives wrt to input, if requested
+        return (dw, db, dx) # return derivatives
+
+# engine using a zero-copy window view of the input (np.lib.stride_tricks) contracted with the filters by np.tensordot; only the
+# input itself is cached for back propagation; padding is not supported (it would need a padded copy of the input)
+class StridedEngine(ConvEngine):
+    @staticmethod
+    def Supports(stride, padding, dilation): return tuple(padding) == (0, 0)
+
+    def Forward(self, x, w, tr_flag):
+        x = np.reshape(x, (x.shape[0],) + self._in_shape) # unravel input images
+        self._x = x if tr_flag else None # cache input, if training
+        win = self._Windows(x) # get windows, shape (N, OH, OW, C, fh, fw)
+        z = np.tensordot(win, np.reshape(w, (w.shape[0],) + self._f_shape + (-1,)), ((3, 4, 5), (0, 1, 2))) # calculate weighted inputs
+        return np.reshape(z, (x.shape[0], -1)) # shape to mini-batch
+
+    def Backward(self, dz, w, no_dx):
+        num, (c, f, d) = dz.shape[0], w.shape
+        dz = np.reshape(dz, (num,) + self._out_shape + (d,)) # unravel dz completely
+        db = np.sum(dz, (0, 1, 2)) / num # sum dz's (within each layer channel) and average over mini-batch to get db
+        dw = np.reshape(np.tensordot(self._Windows(self._x), dz, ((0, 1, 2), (0, 1, 2))), (c, f, d)) / num # calculate dw (summed over mini-batch)
+        self._x = None # clear cached input
+
+        dx = None if no_dx else self._Col2Im(dz, w) # calculate cost derivatives wrt to input, if requested
+        return (dw, db, dx) # return derivatives
+
+    def _Windows(self, x): # returns (zero-copy) view of filter windows in batch of images x, shape (N, OH, OW, C, fh, fw)
+        (oh, ow), (sh, sw), (dh, dw) = self._out_shape, self._stride, self._dilation
+        span = (dh * (self._f_shape[0] - 1) + 1, dw * (self._f_shape[1] - 1) + 1) # extent of (dilated) filter
+        win = np.lib.stride_tricks.sliding_window_view(x, span, (1, 2)) # get all windows of that extent
+        return win[:, : sh*(oh-1) + 1 : sh, : sw*(ow-1) + 1 : sw, :, ::dh, ::dw] # apply stride and dilation
+
+# engine using FFTs (of size H x W, which is large enough for all correlations/convolutions to be free of wrap-around); suits large filters;
+# only stride 1 without padding or dilation is supported
+class FftEngine(ConvEngine):
+    @staticmethod
+    def Supports(stride, padding, dilation): return (tuple(stride), tuple(padding), tuple(dilation)) == ((1, 1), (0, 0), (1, 1))
+
+    def Forward(self, x, w, tr_flag):
+        num, (oh, ow), s = x.shape[0], self._out_shape, self._in_shape[:-1]
+        x_hat = np.fft.rfft2(np.transpose(np.reshape(x, (num,) + self._in_shape), (0, 3, 1, 2)), s) # transform input, shape (N, C, H, W')
+        w_hat = np.fft.rfft2(np.transpose(np.reshape(w, (w.shape[0],) + self._f_shape + (-1,)), (0, 3, 1, 2)), s) # transform filters
+        self._x_hat, self._w_hat = (x_hat, w_hat) if tr_flag else (None, None) # cache transforms, if training
+        z = np.fft.irfft2(np.einsum('nchw,cdhw->ndhw', x_hat, np.conj(w_hat)), s)[:, :, :oh, :ow] # correlate input with filters
+        z = np.transpose(z, (0, 2, 3, 1)).astype(x.dtype) # push layer channels to last index
+        return np.reshape(z, (num, -1)) # shape to mini-batch
+
+    def Backward(self, dz, w, no_dx):
+        num, (c, f, d), s = dz.shape[0], w.shape, self._in_shape[:-1]
+        dz = np.reshape(dz, (num,) + self._out_shape + (d,)) # unravel dz completely
+        db = np.sum(dz, (0, 1, 2)) / num # sum dz's (within each layer channel) and average over mini-batch to get db
+        dz_hat = np.fft.rfft2(np.transpose(dz, (0, 3, 1, 2)), s) # transform dz, shape (N, D, H, W')
+        dw = np.fft.irfft2(np.einsum('nchw,ndhw->cdhw', self._x_hat, np.conj(dz_hat)), s)[:, :, :self._f_shape[0], :self._f_shape[1]]
+        dw = np.reshape(np.transpose(dw, (0, 2, 3, 1)), (c, f, d)).astype(dz.dtype) / num # calculate dw (correlate input with dz)
+        dx = None if no_dx else np.fft.irfft2(np.einsum('ndhw,cdhw->nchw', dz_hat, self._w_hat), s) # calculate dx (convolve dz with filters)
+        if dx is not None: dx = np.reshape(np.transpose(dx, (0, 2, 3, 1)).astype(dz.dtype), (num, -1)) # shape dx to mini-batch
+        self._x_hat = self._w_hat = None # clear cached transforms
+        return (dw, db, dx) # return derivatives
+
+# maps between json labels and convolution engine classes
+map_from_json = {
+    'gemm': GemmEngine,
+    'strided': StridedEngine,
+    'fft': FftEngine
+    }
+map_to_json = { val: key for (key, val) in map_from_json.items() }
+
+_choices = {} # fastest engine found for each (input shape, filter shape, depth, filter geometry, dtype)
+
+# creates convolution engine given by json label algo; 'auto' picks the fastest engine (supporting the filter geometry) for the layer
+# from a quick benchmark of forward and backward passes (the choice is remembered for layers of the same shape)
+def Create(algo, in_shape, f_shape, depth, dtype, stride=(1,1), padding=(0,0), dilation=(1,1)):
+    geometry = (tuple(stride), tuple(padding), tuple(dilation))
+    if algo != 'auto':
+        assert map_from_json[algo].Supports(*geometry) # check engine supports filter geometry
+        return map_from_json[algo](in_shape, f_shape, depth, *geometry)
+    key = (tuple(in_shape), tuple(f_shape), depth, geometry, np.dtype(dtype).name)
+    if key not in _choices: _choices[key] = _Benchmark(in_shape, f_shape, depth, dtype, geometry)
+    return _choices[key](in_shape, f_shape, depth, *geometry)
+
+def _Benchmark(in_shape, f_shape, depth, dtype, geometry, num=16, repeats=2): # returns fastest engine class for layer (on small mini-batch)
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal((num, int(np.prod(in_shape)))).astype(dtype) # random inputs
+    w = rng.standard_normal((in_shape[-1], int(np.prod(f_shape)), depth)).astype(dtype) # random weights
+    times = {}
+    for cls in map_from_json.values(): # time each engine
+        if not cls.Supports(*geometry): continue
+        engine, best = cls(in_shape, f_shape, depth, *geometry), np.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            engine.Backward(engine.Forward(x, w, True), w, False) # (use weighted inputs as dz)
+            best = min(best, time.perf_counter() - start)
+        times[cls] = best
+    return min(times, key=times.get)
+
+def Pair(v): return (v, v) if np.isscalar(v) else tuple(v) # returns v as a pair (eg a stride given as a single int)
+
+# calculates the (2D) shape of a convolution given shapes of input and filter, and the stride, padding (on each side) and dilation
+def ConvShape(in_shape, f_shape, stride=(1,1), padding=(0,0), dilation=(1,1)): 
+    span = np.multiply(dilation, np.subtract(f_shape, 1)) + 1 # extent of (dilated) filter
+    return tuple(int(n) for n in (np.add(in_shape, np.multiply(padding, 2)) - span) // stride + 1)
+
+# builds an im2col index which takes a flattened input image (of shape in_shape) to its im2col representation: row p holds the flat
+# input pixels under output pixel p for each filter position; also returns a mask of the positions that are not padding (None if
+# there is no padding), padded positions have index 0
+@functools.lru_cache(maxsize=None) # (indices are shared by all layers of the same geometry, so are read-only)
+def BuildIdx(in_shape, f_shape, stride=(1,1), padding=(0,0), dilation=(1,1)):
+    (oh, ow), (fh, fw) = ConvShape(in_shape, f_shape, stride, padding, dilation), f_shape
+    r = (np.arange(oh) * stride[0] - padding[0])[:, None, None, None] + (np.arange(fh) * dilation[0])[None, None, :, None] # input rows
+    c = (np.arange(ow) * stride[1] - padding[1])[None, :, None, None] + (np.arange(fw) * dilation[1])[None, None, None, :] # input cols
+    valid = ((r >= 0) & (r < in_shape[0])) & ((c >= 0) & (c < in_shape[1])) # positions inside input image, shape (OH, OW, fh, fw)
+    idx = np.clip(r, 0, in_shape[0] - 1) * in_shape[1] + np.clip(c, 0, in_shape[1] - 1) # flat input pixels
+    idx, valid = np.reshape(idx, (oh * ow, fh * fw)), np.reshape(valid, (oh * ow, fh * fw))
+    idx.flags.writeable = valid.flags.writeable = False
+    return idx, None if valid.all() else valid
+
+# builds, for each filter position, the slices of the input (H, W) and output (OH, OW) images where that filter position lands on an 
+# input pixel (rather than padding); these are rectangles, so col2im can add into strided views of the input; (None, None) if none do
+@functools.lru_cache(maxsize=None) # (slices are shared by all layers of the same geometry, so are returned as a tuple)
+def Col2ImSlices(in_shape, f_shape, stride=(1,1), padding=(0,0), dilation=(1,1)):
+    out_shape, slices = ConvShape(in_shape, f_shape, stride, padding, dilation), []
+    for pos in np.ndindex(*f_shape): # loop over filter positions
+        dst, src = (), ()
+        for n, n_out, k, s, p, dl in zip(in_shape, out_shape, pos, stride, padding, dilation): # loop over axes
+            off = k * dl - p # input pixel of output pixel 0 (for this filter position)
+            lo, hi = max(0, -(off // s)), min(n_out, (n - 1 - off) // s + 1) # range of output pixels that land inside input image
+            dst, src = dst + (slice(lo * s + off, (hi - 1) * s + off + 1, s),), src + (slice(lo, hi),)
+            if hi <= lo: break
+        slices.append((dst, src) if hi > lo else (None, None))
+    return tuple(slices)
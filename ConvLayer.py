@@ -1,83 +1,92 @@
 import numpy as np
-from skimage.util.shape import view_as_windows
 from collections import OrderedDict
 from Layer import Layer
 from Weights_and_Biases import Weights, Biases
 import ActFunc
+import ConvEngine
+import Threads
 
 class ConvLayer(Layer): # 2D convolutional layer of neurons
-    def __init__(self, f_shape, depth, af, prev):
+    # algo selects the convolution engine (see ConvEngine.map_from_json); 'auto' picks the fastest for this layer by benchmarking;
+    # stride, padding (zeros on each side, or 'same' to keep the input size at stride 1, for odd filter extents) and dilation may be
+    # pairs or single ints
+    def __init__(self, f_shape, depth, af, prev, algo='auto', stride=1, padding=0, dilation=1):
         self._f_shape = tuple(f_shape) # store (2D) filter shape 
-        shape = ConvLayer._conv_shape(prev._shape[:-1], self._f_shape) + (depth,) # calculate shape of this layer
+        self._stride, self._dilation = ConvEngine.Pair(stride), ConvEngine.Pair(dilation) # store stride and dilation
+        if padding == 'same': # pad by half the filter extent (which must be odd, as padding is the same on both sides)
+            extent = np.multiply(self._dilation, np.subtract(self._f_shape, 1)) # filter extent - 1
+            assert np.all(extent % 2 == 0), "ConvLayer; 'same' padding needs odd (dilated) filter extents, as padding is symmetric"
+            padding = tuple(extent // 2)
+        self._padding = tuple(int(p) for p in ConvEngine.Pair(padding)) # store padding
+        geometry = (self._stride, self._padding, self._dilation)
+        shape = ConvEngine.ConvShape(prev._shape[:-1], self._f_shape, *geometry) + (depth,) # calculate shape of this layer
         super().__init__(shape, af, prev) # call base initialiser
-        self._w = Weights((prev._shape[-1], np.prod(f_shape), depth), af.sigma(prev._size)) # initialise weights
-        self._b = Biases(depth) # initialise biases
+        self._w = Weights((prev._shape[-1], np.prod(f_shape), depth), af.sigma(prev._size), self._dtype, self._master) # initialise weights
+        self._b = Biases(depth, self._dtype, self._master) # initialise biases
+        self._algo = algo # store requested convolution algorithm
+        self._engines = [] # convolution engines: one for each chunk of mini-batch (when split across threads); created when training
+                           # starts (see Prepare) or when first needed, so layers that never run (eg in inference plans or networks
+                           # loaded for inference) don't create them (or benchmark them, for 'auto')
+        self._chunks = None # chunks of mini-batch split across threads (cached for back propagation, if training)
 
-        # build indexes for faster forward and backward passes
-        self._i2cidx_fwd = ConvLayer._build_i2c_idx(prev._shape[:-1], self._f_shape)
-        self._i2cidx_bck = ConvLayer._build_i2c_idx(np.add(prev._shape[:-1], self._f_shape) - (1,), self._f_shape)
+    # calculate activations; tr_flag specifies whether training or not; the mini-batch is split into chunks that are convolved (each
+    # by its own engine, which caches what its backward pass needs) and activated at once on separate threads (see Threads)
+    def _CalcActivations(self, x, tr_flag): 
+        chunks = Threads.Chunks(x.shape[0])
+        self._chunks = chunks if tr_flag else None
+        self._Engine(len(chunks) - 1) # create engines, if required
+        if len(chunks) == 1: return self._Activate(self._engines[0], x, tr_flag) # (no split)
+        a = np.empty((x.shape[0], self._size), self._dtype)
+        def Chunk(i, lo, hi): a[lo:hi] = self._Activate(self._engines[i], x[lo:hi], tr_flag)
+        Threads.Map(Chunk, chunks)
+        return a
 
-    def _CalcActivations(self, x, tr_flag): # calculate activations; tr_flag specifies whether training or not
-        # transform all input images in mini-batch into columns in preparation for convolution (im2col)
-        x = np.reshape(x, (x.shape[0], -1, self._prev._shape[2])) # unravel (input) channels from x
-        x = np.transpose(x, (0,2,1)) # push (input) channels from last to 2nd index in x
-        cols = x[:,:,self._i2cidx_fwd] # apply im2col transform to input x
-        self._cols = cols if tr_flag else None # cache columns, if training
+    def _Engine(self, i): # returns engine for chunk i (creating engines up to i, if required)
+        geometry = (self._stride, self._padding, self._dilation)
+        if not self._engines: self._engines.append(ConvEngine.Create(self._algo, self._prev._shape, self._f_shape, self._shape[-1], 
+            self._dtype, *geometry)) # create convolution engine
+        while len(self._engines) <= i: self._engines.append(type(self._engines[0])(self._prev._shape, self._f_shape, self._shape[-1], 
+            *geometry)) # create engines for extra chunks (of the same type)
+        return self._engines[i]
 
-        # calculate and return activations
-        a = cols @ self._w.values # calculate weighted inputs (z)
-        a = np.sum(a, 1) + self._b.values # sum z across (input channels) and add biases
-        a = self._af.phi(np.reshape(a, (x.shape[0], -1))) # shape to mini-batch and apply activation function
-        return a 
+    def Algo(self): return ConvEngine.map_to_json[type(self._engines[0])] if self._engines else self._algo # returns engine's json label
 
-    def _CalcDerivatives(self, dz, x, no_dx=False): # performs derivative calculations for convolutional layer
-        # calculate cost derivatives wrt weights and biases
-        dz = np.reshape(dz, (dz.shape[0], -1, self._shape[2])) # unravel layer channels from dz
-        db = np.sum(dz, (0, 1)) / dz.shape[0] # sum dz's (within each layer channel) and average over mini-batch to get db
-        dw = np.transpose(self._cols, (1, 0, 3, 2)) @ dz # calculate dw for each mini-batch input
-        dw = np.sum(dw, 1) / dz.shape[0] # average dw's across inputs in mini-batch
-        self._cols = None # clear this because it's big and no longer needed
+    def Prepare(self): self._Engine(Threads.NumThreads() - 1) # creates engines (running the 'auto' benchmark) before training starts
 
-        # calculate cost derivatives wrt to input, if requested
-        if no_dx: dx = None
-        else:
-            dz = np.reshape(dz, (dz.shape[0],) + self._shape) # unravel dz completely 
-            dz = np.transpose(dz, (0,3,1,2)) # push layer channels in dz forward from last to 2nd index
-            dz = np.pad(dz, ((0,), (0,), (self._f_shape[0] - 1,), (self._f_shape[1] - 1,))) # pad dz for a full convolution
-            dz = np.reshape(dz, (dz.shape[0], dz.shape[1], -1)) # re-ravel the end dimensions (ie the images)
-            w = np.swapaxes(np.flip(self._w.values, 1), 0, 2) # rotate the weights in the filter by 180 degrees and swap the channel axes
-            dx = np.reshape(np.sum(dz[:,:,self._i2cidx_bck] @ w, 1), (x.shape[0], -1)) # calculate dx and shape to mini-batch
+    def _Activate(self, engine, x, tr_flag): # convolves inputs x with engine, then adds biases and applies activation function
+        z = engine.Forward(x, self._w.values, tr_flag) # convolve
+        return np.reshape(self._af.phi_ip(np.reshape(z, (-1, self._shape[-1])), self._b.values), z.shape) # add biases and apply activation function
 
-        return (dw, db, dx) # return derivatives
-   
-    # calculates the shape of a convolution given shapes of input and filter (must be of same dimension)
-    @staticmethod
-    def _conv_shape(in_shape, f_shape): return tuple(np.subtract(in_shape, f_shape) + 1)
-
-    # builds an im2col index which takes a flattened input image to its im2col representation
-    @staticmethod
-    def _build_i2c_idx(in_shape, f_shape): return ConvLayer._im2col(np.arange(np.prod(in_shape)).reshape(in_shape), f_shape)
-
-    # returns the windows in x got by applying filter of given shape; each window is flattened into a row
-    @staticmethod
-    def _im2col(x, f_shape): 
-        w = view_as_windows(x, f_shape) # get the windows in x
-        return w.reshape(-1, np.prod(f_shape)) # flatten windows into rows and return them
+    # performs derivative calculations for convolutional layer (for each chunk of the mini-batch at once, if split across threads)
+    def _CalcDerivatives(self, dz, x, no_dx=False): 
+        chunks, self._chunks = self._chunks, None
+        if len(chunks) == 1: return self._engines[0].Backward(dz, self._w.values, no_dx) # return cost derivatives wrt weights, biases and (optionally) input
+        res = Threads.Map(lambda i, lo, hi: self._engines[i].Backward(dz[lo:hi], self._w.values, no_dx), chunks)
+        scale = [(hi - lo) / dz.shape[0] for lo, hi in chunks] # (engines average over their chunk, so weight by chunk size)
+        dw, db = sum(r[0] * f for r, f in zip(res, scale)), sum(r[1] * f for r, f in zip(res, scale)) # reduce dw and db over chunks
+        return (dw, db, None if no_dx else np.concatenate([r[2] for r in res])) # (with dx of chunks concatenated)
 
-    def Serialise(self): # convert layer to json data (ie a dict)
+    def Serialise(self, with_weights=True): # convert layer to json data (ie a dict), optionally without weights and biases
         d = self._b.values.shape[0] # get depth of this layer
         json_data = OrderedDict([('f_shape', self._f_shape), ('depth', d), ('act_func', ActFunc.map_to_json[self._af])])
-        json_data.update(self._w.Serialise()) # serialise weights
-        json_data.update(self._b.Serialise()) # serialise biases
+        # store filter geometry and convolution algorithm, if not defaults
+        for key, val, default in (('stride', self._stride, (1, 1)), ('padding', self._padding, (0, 0)), ('dilation', self._dilation, (1, 1))):
+            if val != default: json_data[key] = val
+        if self._algo != 'auto': json_data['algo'] = self._algo
+        if with_weights: 
+            json_data.update(self._w.Serialise()) # serialise weights
+            json_data.update(self._b.Serialise()) # serialise biases
         return json_data
 
     @staticmethod
     def Deserialise(json_data, prev): # create fully connected layer from json layer data
-        layer = ConvLayer(json_data['f_shape'], json_data['depth'], ActFunc.map_from_json[json_data['act_func']], prev) # create layer
+        layer = ConvLayer(json_data['f_shape'], json_data['depth'], ActFunc.map_from_json[json_data['act_func']], prev,
+            json_data.get('algo', 'auto'), json_data.get('stride', 1), json_data.get('padding', 0), json_data.get('dilation', 1)) # create layer
         layer._w.Deserialise(json_data) # get weight values
         layer._b.Deserialise(json_data) # get bias values
         return layer
 
     def ToText(self): # convert layer attributes to display text
-        return 'shape={}, f_shape={}, act_func={} (params={:,})'.format(self._shape, self._f_shape, ActFunc.map_to_json[self._af], self.num_params())
+        return 'shape={}, f_shape={}, stride={}, padding={}, dilation={}, act_func={}, algo={} (params={:,})'.format(self._shape, 
+            self._f_shape, self._stride, self._padding, self._dilation, ActFunc.map_to_json[self._af], self.Algo(), self.num_params())
 
@@ -0,0 +1,51 @@
+import collections
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from Batcher import Batcher
+
+# builds the mini-batches of an epoch (slice, expand, normalise) ahead of time in a pool of worker threads (or processes), keeping
+# up to num_prefetch mini-batches queued; create after shuffling the dataset; iterating yields (start, num, X, y) with integer labels y
+# (output layers take labels directly, so no one-hot vectors are built)
+class DataLoader():
+    def __init__(self, ds, params, start=0, num_workers=2, num_prefetch=4, use_processes=False):
+        self._ds, self._params, self._start = ds, params, start # store dataset, hyper-parameters and start of first mini-batch
+        self._num_prefetch = max(1, num_prefetch) # store maximum number of mini-batches built ahead
+        if num_workers == 0: self._pool = None # build mini-batches on the calling thread, otherwise...
+        elif use_processes: # use a pool of processes (forked where possible, so the dataset is shared rather than copied)
+            ctx = mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else mp.get_context()
+            self._pool = ProcessPoolExecutor(num_workers, ctx, _InitWorker, (ds,))
+        else: self._pool = ThreadPoolExecutor(num_workers) # use a pool of threads (numpy releases the GIL for most of the work)
+        self._build = _BuildMiniBatch if use_processes else lambda *args: _BuildMiniBatch(*args, ds=ds) # function run by workers
+
+    def __iter__(self):
+        batches = Batcher(self._ds.num, self._params.batch_size, self._start) # get mini-batches of epoch
+        if self._pool == None: # build each mini-batch when it is needed
+            for start, num in batches: yield (start, num) + _BuildMiniBatch(start, num, self._params.expand_data, self._ds)
+            return
+        pending = collections.deque() # queue of mini-batches being built (in order)
+        try:
+            for start, num in batches:
+                pending.append((start, num, self._pool.submit(self._build, start, num, self._params.expand_data))) # queue next mini-batch
+                if len(pending) >= self._num_prefetch: # wait for oldest mini-batch when queue is full
+                    start, num, future = pending.popleft()
+                    yield (start, num) + future.result()
+            while pending: # wait for remaining mini-batches
+                start, num, future = pending.popleft()
+                yield (start, num) + future.result()
+        finally:
+            for _, _, future in pending: future.cancel() # cancel unused mini-batches (eg if iteration is abandoned)
+
+    def Close(self): # shuts down worker pool
+        if self._pool != None: self._pool.shutdown()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.Close()
+
+_ds = None # dataset used by worker process
+def _InitWorker(ds): # initialises worker process with dataset
+    global _ds
+    _ds = ds
+
+def _BuildMiniBatch(start, num, expand, ds=None): # builds mini-batch; returns inputs X and labels y
+    ds = _ds if ds == None else ds # use worker process dataset if none given
+    return ds.BuildMiniBatch(start, num, expand) # build next batch of inputs
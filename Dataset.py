@@ -1,8 +1,11 @@
 import numpy as np
-import random
 
-class Dataset(): # abstract class for datasets
-    def __init__(self, data, labels, nc): # creates dataset from supplied parameters 
+# abstract class for datasets; data is never reordered: shuffling creates a permutation index that mini-batches are gathered 
+# through; data may be memory-mapped (eg np.load with mmap_mode), in which case mini-batches read just their own rows
+class Dataset(): 
+    augmenter = None # override in derived classes with an Augmenter to expand whole mini-batches at once (instead of using Expand)
+
+    def __init__(self, data, labels, nc, seed=None): # creates dataset from supplied parameters; seed initialises shuffling
         self.data = data # store numpy array holding data
         self.labels = labels # store numpy array holding labels
         self.nc = nc # store number of classes in dataset
@@ -10,30 +13,53 @@ class Dataset(): # abstract class for datasets
         self.item_shape = data[0].shape # store shape of each data item
         self.item_size = np.prod(self.item_shape) # store size of each data item
         self._y_onehot = np.identity(self.nc) # used to map labels to one-hot vectors
+        self.dtype = np.dtype(np.float64) # floating point dtype of mini-batches (set to match the network)
+        self.shuffle_block = None # if set, shuffle blocks of this many consecutive items (and within blocks) so reads stay mostly sequential
+        self._order = None # permutation index giving order of data items (None until shuffled, ie order as loaded)
+        self._mapped = isinstance(data, np.memmap) # whether data is memory-mapped
+        self._rng = np.random.default_rng(seed) # random number generator used for shuffling
+        self._seed = int(self._rng.integers(2**63)) # seed for expanding mini-batches (new one for each shuffle)
 
     @staticmethod
     def Load(path): # loads training, validation and testing datasets from location given by path; returns datasets    
         return (None, None, None)
 
     def BuildMiniBatch(self, start, num, expand=False): # builds batch of num (normalised) inputs X (and corresponding labels y)
-        X = self.data[start : start+num] # get data for specified batch
-        if expand: X = np.array([self.Expand(d) for d in X[:]]) # expand data if required
-        X = self.Normalise(X.reshape(num, self.item_size)) # flatten data to get 1 per row and map to floating point values in [0, 1]
-        y = self.labels[start : start+num] # get labels
+        if self._order is None: idx = slice(start, start+num) # get data items for batch in order as loaded, otherwise...
+        else: 
+            idx = self._order[start : start+num] # gather data items through permutation index
+            if self._mapped: idx = np.sort(idx) # sort indices so memory-mapped reads are in file order
+        X = self.data[idx] # get data for specified batch
+        # expand data if required (random number generator is determined by seed and batch, so any thread or process gets same result)
+        if expand: X = self.ExpandBatch(X, np.random.default_rng((self._seed, start))) 
+        X = self.Normalise(X.reshape(num, self.item_size), self.dtype) # flatten data to get 1 per row and map to floating point values in [0, 1]
+        y = self.labels[idx] # get labels
         return X, y
 
+    def ExpandBatch(self, X, rng): # expands batch of data items X using numpy random generator rng; returns expanded X
+        if self.augmenter != None: return self.augmenter.Augment(X, rng) # expand whole batch at once, if subclass has an augmenter
+        return np.array([self.Expand(d, rng) for d in X[:]]) # otherwise expand each data item
+
     def OneHotEncoding(self, y): # encodes vector of labels into one-hot vector rows
-        return np.array([self._y_onehot[i,] for i in y]) 
+        return np.take(self._y_onehot, y, 0).astype(self.dtype, copy=False) # (gathers all rows at once) 
  
-    def Shuffle(self): # shuffles data and labels (preserves correspondence)
-        shuf = list(zip(self.data, self.labels))
-        random.shuffle(shuf)
-        self.data, self.labels = zip(*shuf) 
-        self.data = np.array(self.data) 
-        self.labels = np.array(self.labels) 
+    def Shuffle(self): # shuffles order of data items (by creating a new permutation index)
+        if self.shuffle_block == None: self._order = self._rng.permutation(self.num) # shuffle all items, otherwise...
+        else: # shuffle order of blocks, and items within each block
+            block = np.arange(self.num) // self.shuffle_block # get block of each item
+            block_rank = self._rng.permutation(block[-1] + 1)[block] # get (shuffled) position of each item's block
+            self._order = np.lexsort((self._rng.random(self.num), block_rank)) # sort by block position then random key
+        self._seed = int(self._rng.integers(2**63)) # get new seed for expanding mini-batches
+
+    def GetState(self): # returns order of data items and random number generator state and seed (for checkpointing)
+        return { 'order': self._order, 'rng': self._rng.bit_generator.state, 'seed': self._seed }
+
+    def SetState(self, state): # restores order of data items and random number generator state and seed from checkpoint
+        self._order = state['order'] 
+        self._rng.bit_generator.state = state['rng']
+        self._seed = state['seed']
 
     @staticmethod
-    def Expand(d): return None # expands data item d in some random way; returns expanded d
+    def Expand(d, rng): return None # expands data item d in some random way (using numpy random generator rng); returns expanded d
     @staticmethod
-    def Normalise(v): return None # normalises data value v; returns normalised v
-    
\ No newline at end of file
+    def Normalise(v, dtype=np.float64): return None # normalises data value v to given dtype; returns normalised v
@@ -0,0 +1,69 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+from Batcher import Batcher
+from Network import Network
+from Inference import InferencePlan
+
+class Metrics(): # classification metrics accumulated over batches: confusion matrix, log loss and top-k accuracy (all vectorised)
+    def __init__(self, nc, k=5):
+        self.nc, self.k = nc, min(k, nc) # store number of classes and k for top-k accuracy
+        self.confusion = np.zeros((nc, nc), np.int64) # counts of outputs for each (expected label, output label)
+        self.num, self.num_top_k, self.sum_loss = 0, 0, 0.0 # number of items, number with expected label in top k, total loss
+
+    # accumulates metrics for batch of output vectors Y_hat given expected labels y; mean loss over the batch is calculated from Y_hat
+    # (as log loss) unless given (eg the cost calculated in training); returns self
+    def Update(self, Y_hat, y, loss=None): 
+        y = np.asarray(y, np.intp)
+        y_out = np.argmax(Y_hat, 1) # convert output vectors to labels
+        self.confusion += np.bincount(y * self.nc + y_out, minlength=self.nc * self.nc).reshape(self.nc, self.nc) # count (expected, output) pairs
+        a = np.take_along_axis(Y_hat, y[:, None], 1) # output for expected label
+        self.num_top_k += int(np.count_nonzero(np.count_nonzero(Y_hat > a, 1) < self.k)) # in top k if fewer than k outputs are greater
+        if loss != None: self.sum_loss += loss * y.size
+        else: self.sum_loss -= float(np.sum(np.log(np.maximum(a, np.finfo(Y_hat.dtype).tiny)))) # log loss (clipped to avoid ln(0))
+        self.num += y.size
+        return self
+
+    def Merge(self, other): # adds metrics accumulated by other (eg over another shard); returns self
+        self.confusion += other.confusion
+        self.num, self.num_top_k, self.sum_loss = self.num + other.num, self.num_top_k + other.num_top_k, self.sum_loss + other.sum_loss
+        return self
+
+    def NumCorrect(self): return int(np.trace(self.confusion)) # number of correct outputs
+    def Accuracy(self): return self.NumCorrect() / max(1, self.num)
+    def TopK(self): return self.num_top_k / max(1, self.num) # top-k accuracy
+    def Loss(self): return self.sum_loss / max(1, self.num) # mean loss (by default, negative log of output for expected label)
+    def Precision(self): return _Ratio(np.diag(self.confusion), self.confusion.sum(0)) # per class precision (0 for classes never output)
+    def Recall(self): return _Ratio(np.diag(self.confusion), self.confusion.sum(1)) # per class recall (0 for classes never expected)
+
+    def ToText(self, per_class=False): # convert metrics to display text, optionally with precision and recall of each class
+        text = 'accuracy={:.2%}, top-{}={:.2%}, loss={:.4f}'.format(self.Accuracy(), self.k, self.TopK(), self.Loss())
+        if per_class: text += ''.join('\n  class {}: precision={:.2%}, recall={:.2%}'.format(c, p, r) 
+            for c, (p, r) in enumerate(zip(self.Precision(), self.Recall())))
+        return text
+
+# evaluates model on dataset ds in batches of batch_size; returns Metrics; a network is run through inference plans (in num_threads
+# threads, each evaluating a contiguous shard of the dataset with its own plan), anything else with FeedForward (eg an inference 
+# plan or trainer) is run as is on this thread
+def Evaluate(model, ds, batch_size=256, k=5, num_threads=1): 
+    if not isinstance(model, Network): num_threads = 1
+    bounds = np.linspace(0, ds.num, num_threads + 1).astype(int) # split dataset into shards (one per thread)
+    pbar = tqdm(desc='Testing', total=ds.num, leave=False, ascii=True) # setup progress bar
+    def Shard(lo, hi): # evaluates items lo to hi
+        run = InferencePlan(model, batch_size).PredictProba if isinstance(model, Network) else model.FeedForward
+        metrics = Metrics(ds.nc, k)
+        for start, num in Batcher(hi, batch_size, lo): # batch up test cases
+            X, y = ds.BuildMiniBatch(start, num) # build next batch of inputs
+            metrics.Update(run(X), y) # feed batch through the network and accumulate metrics
+            pbar.update(num) # update progress bar
+        return metrics
+    if num_threads == 1: metrics = Shard(0, ds.num)
+    else:
+        with ThreadPoolExecutor(num_threads) as pool: shards = list(pool.map(Shard, bounds[:-1], bounds[1:]))
+        metrics = shards[0]
+        for m in shards[1:]: metrics.Merge(m) # reduce metrics of shards
+    pbar.close() # close progress bar
+    return metrics
+
+def _Ratio(num, den): # returns num / den (elementwise, 0 where den is 0)
+    return np.divide(num, den, out=np.zeros(num.shape), where=den > 0)
@@ -6,11 +6,11 @@ import ActFunc
 class FullConLayer(Layer): # fully connected layer of neurons
     def __init__(self, size, af, prev):
         super().__init__((size,), af, prev) # call base initialiser
-        self._w = Weights((prev._size, size), af.sigma(prev._size)) # initialise weights
-        self._b = Biases((1, size)) # initialise biases
+        self._w = Weights((prev._size, size), af.sigma(prev._size), self._dtype, self._master) # initialise weights
+        self._b = Biases((1, size), self._dtype, self._master) # initialise biases
 
-    # calculate activations from input x
-    def _CalcActivations(self, x, tr_flag): return self._af.phi(x @ self._w.values + self._b.values) 
+    # calculate activations from input x (adding biases and applying activation function in place)
+    def _CalcActivations(self, x, tr_flag): return self._af.phi_ip(x @ self._w.values, self._b.values) 
 
     def _CalcDerivatives(self, dz, x, no_dx=False): # performs derivative calculations for fully connected layer
         dw = (x.transpose() @ dz) / x.shape[0] # calculate cost derivatives wrt to weights (average over mini-batch)
@@ -18,10 +18,11 @@ class FullConLayer(Layer): # fully connected layer of neurons
         dx =  None if no_dx else dz @ self._w.values.transpose() # calculate cost derivative wrt x if requested
         return (dw, db, dx)
 
-    def Serialise(self): # convert layer to json data (ie a dict)
+    def Serialise(self, with_weights=True): # convert layer to json data (ie a dict), optionally without weights and biases
         json_data = OrderedDict([('size', self._size), ('act_func', ActFunc.map_to_json[self._af])])
-        json_data.update(self._w.Serialise()) # serialise weights
-        json_data.update(self._b.Serialise()) # serialise biases
+        if with_weights: 
+            json_data.update(self._w.Serialise()) # serialise weights
+            json_data.update(self._b.Serialise()) # serialise biases
         return json_data
 
     @staticmethod
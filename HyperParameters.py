@@ -1,10 +1,18 @@
 from collections import namedtuple
 
-HyperParameters = namedtuple('HyperParameters', 'eta L2 mu batch_size expand_data', defaults=(0.05, 0.0001, 0.25, 11, True))
+HyperParameters = namedtuple('HyperParameters', 'eta L2 mu batch_size expand_data optimizer beta1 beta2 eps accum_steps label_smoothing', 
+    defaults=(0.05, 0.0001, 0.25, 11, True, 'momentum', 0.9, 0.999, 1e-8, 1, 0.0))
 
 # Parameters: 
 #   eta: learning rate
 #   L2: L2 regularisation parameter (0 = no weight decay)
 #   mu: momentum parameter in [0, 1] (0 = none)
 #   batch_size: size of mini-batches
-#   expand_data: boolean flag specifying whether to augment data
\ No newline at end of file
+#   expand_data: boolean flag specifying whether to augment data
+#   optimizer: name of optimizer used to update weights and biases ('momentum', 'nesterov', 'rmsprop' or 'adam')
+#   beta1: decay rate for running averages of cost derivatives (adam)
+#   beta2: decay rate for running averages of squared cost derivatives (rmsprop, adam)
+#   eps: small constant that stops division by zero (rmsprop, adam)
+#   accum_steps: number of mini-batches to accumulate cost derivatives over before updating weights and biases
+#   label_smoothing: amount of label smoothing in [0, 1) (expected outputs are 1 - label_smoothing + label_smoothing / nc for the
+#       label, label_smoothing / nc for other classes; 0 = none)
\ No newline at end of file
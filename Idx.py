@@ -0,0 +1,45 @@
+import os
+import gzip
+import hashlib
+import numpy as np
+
+# IDX file format (as used by MNIST): magic number (2 zero bytes, data type code, number of dimensions), big-endian int32 size of
+# each dimension, then the data (big-endian); files may be gzip compressed
+_idx_dtypes = { 0x08: '>u1', 0x09: '>i1', 0x0B: '>i2', 0x0C: '>i4', 0x0D: '>f4', 0x0E: '>f8' } # maps data type codes to dtypes
+_chunk_size = 1 << 24 # number of bytes decoded at a time when building a cache file
+
+# loads array from IDX file fn (gzip compressed if name ends in .gz); if cache_dir is given, the file is decoded once into an
+# uncompressed .npy cache file there, which is then memory-mapped (so only the rows actually used are read from disk); cache files
+# are named after the source file's full path (so files of the same name, eg from MNIST and Fashion-MNIST, can share cache_dir)
+def LoadIdx(fn, cache_dir=None):
+    if cache_dir == None: # load whole array into memory
+        with _Open(fn) as f:
+            dtype, shape = _ReadHeader(f)
+            return np.frombuffer(f.read(), dtype, np.prod(shape)).reshape(shape).astype(dtype.newbyteorder('='))
+    key = hashlib.sha1(os.path.abspath(fn).encode('utf-8')).hexdigest()[:12] # short hash of source path
+    fn_cache = os.path.join(cache_dir, '{}-{}.npy'.format(os.path.basename(fn).replace('.gz', ''), key)) # name of cache file
+    if not os.path.exists(fn_cache) or os.path.getmtime(fn_cache) < os.path.getmtime(fn): _BuildCache(fn, fn_cache) # (re)build cache
+    return np.load(fn_cache, mmap_mode='r') # memory-map cache file
+
+def _BuildCache(fn, fn_cache): # decodes IDX file fn into .npy cache file fn_cache (in chunks, without holding whole array in memory)
+    os.makedirs(os.path.dirname(fn_cache) or '.', exist_ok=True)
+    fn_tmp = fn_cache + '.tmp' # write to temporary file first so a partial cache file is never used
+    with _Open(fn) as f:
+        dtype, shape = _ReadHeader(f)
+        cache = np.lib.format.open_memmap(fn_tmp, 'w+', dtype.newbyteorder('='), shape) # create cache file
+        flat = cache.reshape(-1) # flat view of cache
+        step = max(1, _chunk_size // dtype.itemsize) # number of values per chunk
+        for start in range(0, flat.size, step): # decode each chunk
+            num = min(step, flat.size - start)
+            flat[start : start+num] = np.frombuffer(f.read(num * dtype.itemsize), dtype, num)
+        cache.flush()
+        del flat, cache # close cache file
+    os.replace(fn_tmp, fn_cache)
+
+def _Open(fn): return gzip.open(fn) if fn.endswith('.gz') else open(fn, 'rb') # opens IDX file (compressed or not)
+
+def _ReadHeader(f): # reads IDX header from file f; returns dtype and shape of data
+    magic = f.read(4) # read magic number
+    assert magic[0] == 0 and magic[1] == 0 and magic[2] in _idx_dtypes, "IDX; file format" # check magic number
+    shape = tuple(int.from_bytes(f.read(4), byteorder='big') for _ in range(magic[3])) # read dimensions
+    return np.dtype(_idx_dtypes[magic[2]]), shape
@@ -0,0 +1,109 @@
+import numpy as np
+import ConvEngine
+import Threads
+from FullConLayer import FullConLayer
+from ConvLayer import ConvLayer
+from MaxPoolLayer import MaxPoolLayer
+from AvgPoolLayer import AvgPoolLayer, GlobalAvgPoolLayer
+
+# compiled inference plan for a network: a flat list of layer ops, each writing its activations into an output buffer allocated 
+# once (for max_batch inputs) and reused by every call, so running the plan allocates (almost) nothing; training-only caches are
+# never created; the plan shares the network's weights and biases, so it sees any later updates; a plan is not thread-safe (use
+# one per thread); larger batches are run max_batch inputs at a time; conv layer ops split batches across threads (see Threads)
+class InferencePlan():
+    def __init__(self, net, max_batch=256):
+        self._dtype, self._max_batch = net.dtype, max_batch # store compute dtype and maximum batch size
+        layer = net._first_layer # start with (input) first layer
+        self._in_buf = np.empty((max_batch, layer._size), self._dtype) # buffer for inputs (converted to compute dtype)
+        self._ops = [] # list of (op, output buffer) for layers
+        layer = layer._next
+        while layer != None: # loop over each subsequent layer
+            op = getattr(self, next(name for cls, name in InferencePlan._compilers if isinstance(layer, cls)))(layer) # compile op for layer
+            self._ops.append((op, np.empty((max_batch, layer._size), self._dtype))) # allocate output buffer
+            layer = layer._next
+        self.num_out = net._last_layer._size # store number of outputs
+
+    def FeedForward(self, X): return self.PredictProba(X) # returns output activations (so a plan can stand in for its network)
+
+    def PredictProba(self, X, out=None): # returns output activations for batch of input vectors X (written to out, if given)
+        if out is None: out = np.empty((X.shape[0], self.num_out), self._dtype)
+        for start in range(0, X.shape[0], self._max_batch): out[start : start+self._max_batch] = self._Run(X[start : start+self._max_batch])
+        return out
+
+    def Predict(self, X): # returns predicted labels for batch of input vectors X
+        y = np.empty(X.shape[0], np.intp)
+        for start in range(0, X.shape[0], self._max_batch): np.argmax(self._Run(X[start : start+self._max_batch]), 1, out=y[start : start+self._max_batch])
+        return y
+
+    def TopK(self, X, k=5): # returns top k labels (most likely first) and their output activations for batch of input vectors X
+        labels, values = np.empty((X.shape[0], k), np.intp), np.empty((X.shape[0], k), self._dtype)
+        for start in range(0, X.shape[0], self._max_batch):
+            a = self._Run(X[start : start+self._max_batch])
+            idx = np.argpartition(a, -k, 1)[:, -k:] if k < a.shape[1] else np.broadcast_to(np.arange(a.shape[1]), a.shape) # find top k (unordered)
+            v = np.take_along_axis(a, idx, 1)
+            order = np.argsort(-v, 1) # sort top k
+            labels[start : start+self._max_batch] = np.take_along_axis(idx, order, 1)
+            values[start : start+self._max_batch] = np.take_along_axis(v, order, 1)
+        return labels, values
+
+    # runs plan on batch of (at most max_batch) input vectors X; returns output activations (a view of output buffer); observe (if
+    # given) is called with the index of each layer op and its input
+    def _Run(self, X, observe=None): 
+        n = X.shape[0]
+        x = self._in_buf[:n]
+        np.copyto(x, np.reshape(X, (n, -1)), 'unsafe') # convert input to compute dtype
+        for i, (op, buf) in enumerate(self._ops): # run each layer op on activations of previous layer
+            if observe != None: observe(i, x)
+            op(x, buf[:n])
+            x = buf[:n]
+        return x
+
+    # compilers for layer ops; each returns a function op(x, out) that calculates layer's activations for inputs x into out
+
+    def _CompileFullCon(self, layer): # fully connected (and output) layers
+        def op(x, out):
+            np.matmul(x, layer._w.values, out=out) # calculate weighted inputs
+            layer._af.phi_ip(out, layer._b.values) # add biases and apply activation function
+        return op
+
+    def _CompileConv(self, layer): # convolutional layers, using im2col (like the gemm engine) with preallocated columns
+        prev, depth = layer._prev, layer._shape[-1]
+        idx, valid = ConvEngine.BuildIdx(prev._shape[:-1], layer._f_shape, layer._stride, layer._padding, layer._dilation) # im2col index
+        (p, f), c = idx.shape, prev._shape[-1]
+        cols = np.empty((self._max_batch, p, f, c), self._dtype) # buffer for columns
+        w = np.empty((f, c, depth), self._dtype) # buffer for weights (reordered to match columns)
+        def Chunk(x, out, lo, hi): # runs op on inputs lo to hi (chunks of a batch run at once on separate threads; see Threads)
+            n = hi - lo
+            np.take(np.reshape(x[lo:hi], (n, -1, c)), idx, 1, cols[lo:hi], 'clip') # apply im2col transform to input x (clip mode writes out directly)
+            if valid is not None: cols[lo:hi] *= valid[:, :, None] # zero padding
+            z = np.reshape(out[lo:hi], (n * p, depth)) 
+            np.matmul(np.reshape(cols[lo:hi], (n * p, f * c)), np.reshape(w, (f * c, depth)), out=z) # calculate weighted inputs
+            layer._af.phi_ip(z, layer._b.values) # add biases and apply activation function
+        def op(x, out):
+            np.copyto(w, np.transpose(layer._w.values, (1, 0, 2))) # reorder weights
+            Threads.Map(lambda i, lo, hi: Chunk(x, out, lo, hi), Threads.Chunks(x.shape[0]))
+        return op
+
+    def _CompileMaxPool(self, layer): # maxpool layers
+        def op(x, out):
+            n = x.shape[0]
+            a = np.reshape(out, (n,) + layer._shape)
+            a.fill(-np.inf)
+            for _, xv, av in layer._Views(np.reshape(x, (n,) + layer._prev._shape), a): np.maximum(av, xv, out=av) # update maxima
+        return op
+
+    def _CompileAvgPool(self, layer): # average pool layers
+        def op(x, out):
+            n = x.shape[0]
+            a = np.reshape(out, (n,) + layer._shape)
+            a.fill(0)
+            for _, xv, av in layer._Views(np.reshape(x, (n,) + layer._prev._shape), a): av += xv # sum pools
+            a *= layer._scale # get averages
+        return op
+
+    def _CompileGlobalAvgPool(self, layer): # global average pool layers
+        def op(x, out): np.mean(np.reshape(x, (x.shape[0], -1, layer._shape[-1])), 1, out=out)
+        return op
+
+    _compilers = [(FullConLayer, '_CompileFullCon'), (ConvLayer, '_CompileConv'), (MaxPoolLayer, '_CompileMaxPool'), (AvgPoolLayer, '_CompileAvgPool'),
+        (GlobalAvgPoolLayer, '_CompileGlobalAvgPool')] # (layer class, compiler name) for each type of layer (output layers are fully connected)
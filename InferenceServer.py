@@ -0,0 +1,147 @@
+import json
+import time
+import asyncio
+import collections
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from Inference import InferencePlan
+
+# http inference server (asyncio, standard library only): requests are queued and collected into micro-batches of up to max_batch
+# inputs, waiting at most max_wait seconds after the first one; each micro-batch is run in one go by one of num_replicas inference
+# plans (in a pool of threads, so several can run at once) and results are scattered back to their requests
+#
+# endpoints: POST /predict with json body { "inputs": [[...], ...] } (normalised input vectors) returns { "labels": [...],
+# "probs": [[...], ...] }; GET /stats returns queue depth, request and batch counts, and p50/p99 latency (queueing plus compute);
+# request bodies larger than max_body bytes are refused (413), as are invalid content lengths (400)
+class InferenceServer():
+    def __init__(self, net, max_batch=64, max_wait=0.002, num_replicas=1, host='127.0.0.1', port=8000, num_latencies=10000,
+            max_body=2**24):
+        self._max_batch, self._max_wait = max_batch, max_wait # store micro-batching limits
+        self._max_body = max_body # store largest request body accepted (bytes)
+        self._host, self._port = host, port # store address to listen on
+        self._plans = [InferencePlan(net, max_batch) for _ in range(num_replicas)] # replicas (share weights, own buffers); idle ones
+        self._pool = ThreadPoolExecutor(num_replicas) # threads that run micro-batches
+        self._num_in, self._dtype = net._first_layer._size, net.dtype # store input size and dtype
+        self._latencies = collections.deque(maxlen=num_latencies) # latencies of most recent requests
+        self._num_requests, self._num_batches, self._num_queued = 0, 0, 0 # counts of requests and batches, number of inputs queued
+        self._pending = collections.deque() # queue of requests (inputs, future, arrival time) waiting for a micro-batch
+        self._server, self._batcher = None, None # created when started (need event loop)
+
+    async def Start(self): # starts batching requests and listening for http connections
+        self._arrived = asyncio.Event() # set when a request is queued
+        self._replicas = asyncio.Semaphore(len(self._plans)) # limits number of micro-batches running at once
+        self._batcher = asyncio.ensure_future(self._Batcher())
+        self._server = await asyncio.start_server(self._Handle, self._host, self._port)
+        self.port = self._server.sockets[0].getsockname()[1] # store port (in case an arbitrary one was requested with 0)
+
+    async def Stop(self): # stops listening and batching
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        self._pool.shutdown()
+
+    def Run(self): # runs server until interrupted
+        async def Main():
+            await self.Start()
+            print('Serving on {}:{}'.format(self._host, self.port))
+            await self._server.serve_forever()
+        try: asyncio.run(Main())
+        except KeyboardInterrupt: pass
+
+    async def Predict(self, X): # queues batch of input vectors X for the next micro-batch; returns their output activations
+        X = np.asarray(X, self._dtype).reshape(-1, self._num_in)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((X, future, time.perf_counter()))
+        self._num_queued += X.shape[0]
+        self._arrived.set()
+        return await future
+
+    def Stats(self): # returns server statistics
+        lat = np.array(self._latencies) * 1000
+        p50, p99 = np.percentile(lat, (50, 99)) if lat.size else (0, 0)
+        return { 'queue_depth': self._num_queued, 'requests': self._num_requests, 'batches': self._num_batches,
+            'mean_batch_requests': self._num_requests / max(1, self._num_batches), 'p50_ms': float(p50), 'p99_ms': float(p99) }
+
+    async def _Batcher(self): # collects queued requests into micro-batches and starts running them
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending: await self._Arrival(None) # wait for first request of micro-batch
+            deadline = loop.time() + self._max_wait
+            while self._num_queued < self._max_batch: # wait until micro-batch is full or has waited long enough
+                timeout = deadline - loop.time()
+                if timeout <= 0 or not await self._Arrival(timeout): break
+            await self._replicas.acquire() # wait for a free replica (more requests may arrive meanwhile)
+            batch = [self._pending.popleft()] # take requests from queue (up to max_batch inputs, but at least one request)
+            num = batch[0][0].shape[0]
+            while self._pending and num + self._pending[0][0].shape[0] <= self._max_batch: 
+                batch.append(self._pending.popleft())
+                num += batch[-1][0].shape[0]
+            self._num_queued -= num
+            asyncio.ensure_future(self._RunBatch(batch))
+
+    async def _Arrival(self, timeout): # waits (at most timeout seconds, if not None) for another request; returns whether one arrived
+        self._arrived.clear()
+        try: await asyncio.wait_for(self._arrived.wait(), timeout)
+        except asyncio.TimeoutError: return False
+        return True
+
+    async def _RunBatch(self, batch): # runs micro-batch on a free replica, then scatters results back to requests
+        plan = self._plans.pop()
+        try:
+            X = np.concatenate([X for X, _, _ in batch]) if len(batch) > 1 else batch[0][0]
+            Y = await asyncio.get_running_loop().run_in_executor(self._pool, plan.PredictProba, X)
+        except Exception as e: # pass error on to requests
+            for _, future, _ in batch: 
+                if not future.done(): future.set_exception(e)
+            return
+        finally:
+            self._plans.append(plan)
+            self._replicas.release()
+        t, start = time.perf_counter(), 0
+        for X, future, t_arrival in batch: # scatter results
+            if not future.done(): future.set_result(Y[start : start+X.shape[0]])
+            start += X.shape[0]
+            self._latencies.append(t - t_arrival)
+        self._num_requests += len(batch)
+        self._num_batches += 1
+
+    async def _Handle(self, reader, writer): # handles http connection (requests are answered in turn; connections are kept alive)
+        try:
+            while True:
+                line = await reader.readline() # read request line
+                if not line: break
+                method, path = line.decode('latin-1').split()[:2]
+                headers = {}
+                while True: # read headers
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''): break
+                    key, _, val = line.decode('latin-1').partition(':')
+                    headers[key.strip().lower()] = val.strip()
+                length = headers.get('content-length', '0')
+                if not length.isdecimal(): # refuse invalid (eg negative) or oversized body (unread, so connection is closed)
+                    await self._Respond(writer, '400 Bad Request', { 'error': 'invalid content-length' }, True)
+                    break
+                if int(length) > self._max_body:
+                    await self._Respond(writer, '413 Payload Too Large', { 'error': 'body larger than {} bytes'.format(self._max_body) }, True)
+                    break
+                body = await reader.readexactly(int(length)) # read body
+                close = headers.get('connection', '').lower() == 'close'
+                await self._Respond(writer, *await self._Route(method, path, body), close)
+                if close: break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError): pass # drop broken connections
+        finally: writer.close()
+
+    async def _Respond(self, writer, status, data, close=False): # writes http response with json data
+        data = json.dumps(data).encode('utf-8')
+        writer.write('HTTP/1.1 {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n{}\r\n'.format(status, len(data),
+            'Connection: close\r\n' if close else '').encode('latin-1') + data)
+        await writer.drain()
+
+    async def _Route(self, method, path, body): # handles http request; returns status and json data
+        if method == 'GET' and path == '/stats': return '200 OK', self.Stats()
+        if method != 'POST' or path != '/predict': return '404 Not Found', { 'error': 'unknown endpoint' }
+        try: X = np.asarray(json.loads(body)['inputs'], self._dtype)
+        except (ValueError, KeyError, TypeError): return '400 Bad Request', { 'error': 'body must be json { "inputs": [[...], ...] }' }
+        if X.ndim != 2 or X.shape[1] != self._num_in: return '400 Bad Request', { 'error': 'inputs must have {} values each'.format(self._num_in) }
+        Y = await self.Predict(X)
+        return '200 OK', { 'labels': np.argmax(Y, 1).tolist(), 'probs': Y.tolist() }
@@ -1,16 +1,22 @@
+import numpy as np
 from collections import OrderedDict
 from Layer import Layer
 
 class InputLayer(Layer): # input layer of neurons; must be first layer in network
     def __init__(self, shape): super().__init__(shape, None, None) # call base initialiser
 
+    def SetPrecision(self, dtype, master=False): # sets compute dtype (and master weights flag) inherited by all subsequent layers
+        self._dtype = np.dtype(dtype)
+        self._master = master
+
     def _CalcActivations(self, x, tr_flag): 
+        x = x.astype(self._dtype, copy=False) # convert input to compute dtype (no copy if already converted)
         self._a = x if tr_flag else None # store input as activations if training (for subsequent back propagation)
         return x # return input as activations
 
-    def BackProp(self, da, params): pass # no back propagation at this layer
+    def BackProp(self, da): pass # no back propagation at this layer
 
-    def Serialise(self): # convert layer to json data (ie a dict)
+    def Serialise(self, with_weights=True): # convert layer to json data (ie a dict)
         return OrderedDict([('shape', self._shape)])
 
     @staticmethod
@@ -6,6 +6,8 @@ class Layer():
         self._af = af # store activation function
         self._shape = tuple(shape) # store shape of layer
         self._size = int(np.prod(shape)) # store number of nodes in this layer
+        self._dtype = np.dtype(np.float64) if prev == None else prev._dtype # compute dtype (inherited from previous layer)
+        self._master = False if prev == None else prev._master # whether to keep float64 master copy of weights (inherited)
 
         # layer storage
         self._w = None # weights
@@ -19,10 +21,11 @@ class Layer():
     # override these for derived classes
     def _CalcActivations(self, x, tr_flag): return None
     def _CalcDerivatives(self, dz, x, no_dx): return (None, None, None)
-    def Serialise(self): return None
+    def Serialise(self, with_weights=True): return None
     @staticmethod
     def Deserialise(json_data, prev): return None
     def ToText(self): return None
+    def Prepare(self): pass # prepares layer for training (creating anything it otherwise creates when first run)
 
     # calculates activations then feeds them forward through the network; flag specifies whether training or not
     def FeedForward(self, x, tr_flag): 
@@ -30,17 +33,17 @@ class Layer():
         self._a = a if tr_flag else None # cache activations if training
         return self._next.FeedForward(a, tr_flag) # feed activations forward, return ultimate output
 
-    # updates weights and biases in this layer using cost derivative of (output) activations and provided parameters; 
-    # calculates cost derivative wrt inputs and passes this back through the network to adjust previous layers
-    def BackProp(self, da, params):
+    # calculates cost derivatives wrt weights and biases in this layer using cost derivative of (output) activations (accumulates 
+    # them with the weights and biases for a later update); calculates cost derivative wrt inputs and passes this back through the network
+    def BackProp(self, da):
         dz = self._CalcDz(da) # calculate cost derivatives wrt to weighted inputs
         (dw, db, dx) = self._CalcDerivatives(dz, self._prev._a, self._prev._prev == None) # get other derivatives (except dx for 2nd layer)
-        self._w.GradDesc(dw, params) # update weights using gradient descent
-        self._b.GradDesc(db, params) # update biases using gradient descent
-        self._prev.BackProp(dx, params) # back-propagate cost derivative wrt to inputs (= activations of previous layer)
+        self._w.AddGrad(dw) # accumulate derivatives for a later update
+        self._b.AddGrad(db)
+        self._prev.BackProp(dx) # back-propagate cost derivative wrt to inputs (= activations of previous layer)
 
-    # calculates cost derivatives wrt weighted inputs given those wrt activations using current layer activations
-    def _CalcDz(self, da): return da * self._af.phi_prime(self._a)
+    # calculates cost derivatives wrt weighted inputs given those wrt activations using current layer activations (overwrites da)
+    def _CalcDz(self, da): return self._af.dz_ip(da, self._a)
 
     # calculates the number of trainable parameters in this layer
     def num_params(self): 
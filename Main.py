@@ -1,45 +1,73 @@
-import sys
 import os
-import numpy as np
 from tqdm import tqdm
 #from tqdm_fix import tqdm_fix as tqdm
-from Batcher import Batcher
 from Stopwatch import Stopwatch
 from Network import Network
+from Parallel import ParallelTrainer
+from DataLoader import DataLoader
 from HyperParameters import HyperParameters
+from Quantize import QuantizedPlan
+from Evaluate import Evaluate, Metrics
 
-def TestNetwork(net, ds, batch_size=64): # runs given dataset through network; counts number of correct outputs
-    sum_correct = 0 # total number of correct outputs
-    pbar = tqdm(desc='Testing', total=ds.num, leave=False, ascii=True) # setup progress bar
-    for start, num in Batcher(ds.num, batch_size): # batch up test cases
-        X, y_exp = ds.BuildMiniBatch(start, num) # build next batch of inputs
-        Y_hat = net.FeedForward(X) # feed batch through the network, get output vectors for batch
-        y_out = np.argmax(Y_hat, axis=1) # convert output vectors to labels
-        sum_correct += sum(out == exp for (out, exp) in zip(y_out, y_exp)) # count correct outputs and add to total
-        pbar.update(num) # update progress bar
-    pbar.close() # close progress bar
-    return sum_correct
+# tests network (or inference plan) against dataset; returns Metrics (see Evaluate)
+def TestNetwork(net, ds, batch_size=256, num_threads=1): return Evaluate(net, ds, batch_size, num_threads=num_threads)
+
+# quantizes network to int8 (calibrated on dataset ds_cal) and reports accuracy on dataset ds against the float network; returns 
+# the quantized inference plan
+def TestQuantization(net, ds_cal, ds, num_calib=1000):
+    qplan = QuantizedPlan(net, ds_cal, num_calib) # quantize network
+    acc, acc_q = TestNetwork(net, ds).Accuracy(), TestNetwork(qplan, ds).Accuracy() # test both networks
+    print('Float accuracy: {:.2%}, int8 accuracy: {:.2%} (delta {:+.2%}); weights {:,} bytes -> {:,} bytes stored ({:,} bytes to run)'.format(
+        acc, acc_q, acc_q - acc, net.param_buf.values.nbytes, qplan.weight_bytes, qplan.compute_bytes))
+    return qplan
 
-def TrainEpoch(net, ds, params): # train network over a single epoch using provided dataset
-    pbar = tqdm(desc='Training', total=ds.num, leave=False, ascii=True) # setup progress bar
-    ds.Shuffle() # shuffle training data
-    for start, num in Batcher(ds.num, params.batch_size): # loop over mini-batches
-        X, y = ds.BuildMiniBatch(start, num, params.expand_data) # build next batch of inputs
-        Y_exp = ds.OneHotEncoding(y) # encode labels into one-hot vector rows
-        net.Train(X, Y_exp, params) # feed batch through the network; back-propagate using expected outputs
-        pbar.update(num) # update progress bar
+# train network (or trainer) over a single epoch using provided dataset; a resumed epoch starts at mini-batch start (without 
+# shuffling); on_batch is called after each mini-batch with the start of the next one; mini-batches are built in the background 
+# by num_loaders threads (or processes if loader_processes is set), or on this thread if num_loaders is 0; returns Metrics of the
+# outputs and costs seen during training (each calculated before its mini-batch's update); the running loss is shown on the progress bar
+def TrainEpoch(net, ds, params, start=0, on_batch=None, num_loaders=2, loader_processes=False): 
+    net.PrepareTraining() # create anything layers otherwise create in the first step (eg conv engines)
+    pbar = tqdm(desc='Training', total=ds.num, initial=start, leave=False, ascii=True) # setup progress bar
+    metrics = Metrics(ds.nc) # training metrics
+    if start == 0: ds.Shuffle() # shuffle training data (unless resuming part way through epoch)
+    with DataLoader(ds, params, start, num_loaders, use_processes=loader_processes) as loader: # start building mini-batches
+        for start, num, X, y in loader: # loop over mini-batches
+            Y_hat, loss = net.Train(X, y, params) # feed batch through the network; back-propagate using expected labels
+            metrics.Update(Y_hat, y, loss) # accumulate training metrics
+            if on_batch != None: on_batch(start + num) # eg, checkpoint training state
+            pbar.set_postfix_str('loss={:.4f}'.format(metrics.Loss()), False) # update progress bar (with running loss)
+            pbar.update(num)
     pbar.close() # close progress bar
+    return metrics
 
-def TrainNetwork(net, ds, params, num_epochs): # train network over multiple epochs using provided dataset
+# train network over multiple epochs using provided dataset; mini-batches are split across num_workers processes if more than 1; 
+# training state is saved using checkpointer if provided; training resumes from start_epoch and start (see Checkpoint.Resume);
+# num_loaders and loader_processes control building of mini-batches (see TrainEpoch)
+def TrainNetwork(net, ds, params, num_epochs, num_workers=1, checkpointer=None, start_epoch=1, start=0, num_loaders=2, loader_processes=False): 
     sw_total, sw_epoch = Stopwatch(), Stopwatch() # start timing total training run and first epoch
-    for epoch in range(1, num_epochs + 1): # loop through each epoch
+    trainer = net if num_workers == 1 else ParallelTrainer(net, num_workers, params.batch_size) # create data-parallel trainer if required
+    for epoch in range(start_epoch, num_epochs + 1): # loop through each epoch
         # run next epoch of training
         sw_epoch.Reset() # reset epoch stopwatch
-        TrainEpoch(net, ds, params) # train network for a single epoch
-        num_correct = TestNetwork(net, ds) # test network against data set
-        print('Epoch {}: {:.2%} ({})'.format(epoch, num_correct / ds.num, sw_epoch.FormatCurrentInterval())) # report progress
+        on_batch = None if checkpointer == None else lambda next_start: checkpointer.Update(net, ds, params, epoch, next_start)
+        metrics = TrainEpoch(trainer, ds, params, start if epoch == start_epoch else 0, on_batch, num_loaders, loader_processes) # train for single epoch
+        print('Epoch {}: {} ({})'.format(epoch, metrics.ToText(), sw_epoch.FormatCurrentInterval())) # report progress (metrics seen in training)
+    if trainer is not net: trainer.Close() # shut down worker processes
+    if checkpointer != None: checkpointer.Close() # wait for any pending checkpoint to be written
     print('Training over {} epoch(s) complete ({}).'.format(num_epochs, sw_total.FormatCurrentInterval())) # report total time elapsed
 
+# reference network for MNIST (json string), as used below and by Benchmark
+mnist_net_str = ('{ "dtype": "float32", "master_weights": false, "network": [ '
+    '{ "layer": "input", "shape": [28,28,1] }, '
+    '{ "layer": "conv", "f_shape": [5,5], "depth": 16, "act_func": "leaky_relu" }, '
+    '{ "layer": "maxpool", "p_shape": [2,2] }, '
+    '{ "layer": "conv", "f_shape": [5,5], "depth": 32, "act_func": "leaky_relu" }, '
+    '{ "layer": "maxpool", "p_shape": [2,2] }, '
+    '{ "layer": "full_con", "size": 200, "act_func": "leaky_relu" }, '
+    '{ "layer": "full_con", "size": 100, "act_func": "leaky_relu" }, '
+    '{ "layer": "softmax_output", "size": 10 } '
+    '] }')
+
 # only execute the following if running as main module
 if '__main__' == __name__: 
     dir_work = 'C:\\Users\\georg\\Documents\\Visual Studio Code\\cnn\\projects' # working directory
@@ -51,27 +79,32 @@ if '__main__' == __name__:
     ds_tr, ds_va, ds_te = Mnist.Load(os.path.join(dir_work, 'Mnist\\data'))
 
     #net = Network(json_fn=os.path.join(os.path.join(dir_work, 'Mnist'), nn_in_fn)) # load network from input file
+    #net = Network(bin_fn=os.path.join(os.path.join(dir_work, 'Mnist'), 'nn_in.bin'), mmap_mode='c') # load network from binary file
 
-    # create new network from json
-    net_str = ('{ "network": [ '
-        '{ "layer": "input", "shape": [28,28,1] }, '
-        '{ "layer": "conv", "f_shape": [5,5], "depth": 16, "act_func": "leaky_relu" }, '
-        '{ "layer": "maxpool", "p_shape": [2,2] }, '
-        '{ "layer": "conv", "f_shape": [5,5], "depth": 32, "act_func": "leaky_relu" }, '
-        '{ "layer": "maxpool", "p_shape": [2,2] }, '
-        '{ "layer": "full_con", "size": 200, "act_func": "leaky_relu" }, '
-        '{ "layer": "full_con", "size": 100, "act_func": "leaky_relu" }, '
-        '{ "layer": "softmax_output", "size": 10 } '
-        '] }')
-    net = Network(json_str=net_str)
+    net = Network(json_str=mnist_net_str) # create new network from json
+    #import Threads
+    #Threads.SetNumThreads(4) # split conv layers' mini-batches across 4 threads (with BLAS threads limited to share the cores)
+    ds_tr.dtype = ds_te.dtype = net.dtype # build mini-batches in the network's compute dtype
     
     net.Print() # print the network configuration
-    print('Starting accuracy: {:.2%}'.format(TestNetwork(net, ds_te)/ds_te.num)) # report starting accuracy
+    print('Starting: {}'.format(TestNetwork(net, ds_te).ToText())) # report starting accuracy
 
-    # train network
+    # train network (checkpointing training state every 2 minutes)
     params = HyperParameters(eta=0.05, L2=0.0001, mu=0.25, batch_size=64) # set hyper-parameters
-    TrainNetwork(net, ds_tr, params, num_epochs=1) 
-    print('Ending accuracy: {:.2%}'.format(TestNetwork(net, ds_te)/ds_te.num)) # report ending accuracy
+    from Checkpoint import Checkpointer
+    checkpointer = Checkpointer(os.path.join(os.path.join(dir_work, 'Mnist'), 'checkpoint.npz'), every_secs=120)
+    TrainNetwork(net, ds_tr, params, num_epochs=1, checkpointer=checkpointer) 
+    #import Checkpoint
+    #net, params, epoch, start = Checkpoint.Resume(os.path.join(os.path.join(dir_work, 'Mnist'), 'checkpoint.npz'), ds_tr) # or resume...
+    #TrainNetwork(net, ds_tr, params, num_epochs=1, start_epoch=epoch, start=start)
+    #from Profiler import Profiler
+    #with Profiler(net) as prof: TrainEpoch(net, ds_tr, params) # or profile an epoch (per-layer table, and chrome trace)...
+    #net.Print(prof)
+    #prof.SaveTrace(os.path.join(os.path.join(dir_work, 'Mnist'), 'trace.json'))
+    print('Ending: {}'.format(TestNetwork(net, ds_te, num_threads=4).ToText(True))) # report ending metrics (with precision and recall)
 
+    TestQuantization(net, ds_tr, ds_te) # report accuracy of int8 quantized network (calibrated on training data, as there is no validation set)
     net.Save(os.path.join(os.path.join(dir_work, 'Mnist'), nn_out_fn)) # save network to output file
+    #from InferenceServer import InferenceServer
+    #InferenceServer(net, max_batch=64, num_replicas=2).Run() # serve network over http (POST /predict, GET /stats)
 
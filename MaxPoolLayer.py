@@ -1,40 +1,43 @@
 import numpy as np
-from collections import OrderedDict
-from Layer import Layer
+from PoolLayer import PoolLayer
 
-class MaxPoolLayer(Layer): # 2D maxpool layer of neurons
-    def __init__(self, p_shape, prev):
-        assert (prev._shape[0] % p_shape[0] == 0) and (prev._shape[1] % p_shape[1] == 0) # check pool tiles input evenly
-        shape = (prev._shape[0] // p_shape[0], prev._shape[1] // p_shape[1], prev._shape[-1],) # calculate shape of this layer
-        super().__init__(shape, None, prev) # call base initialiser
-        self._p_shape = tuple(p_shape) # store pool shape as tuple
+class MaxPoolLayer(PoolLayer): # 2D maxpool layer of neurons
+    def __init__(self, p_shape, prev, stride=None, padding=0, dilation=1):
+        super().__init__(p_shape, prev, stride, padding, dilation) # call base initialiser
+        n = np.prod(self._p_shape)
+        self._idx_dtype = np.min_scalar_type(n - 1) # compact dtype for position of maximum in each pool (eg uint8)
 
-    def _CalcActivations(self, x, tr_flag): # calculate activations; tr_flag specifies whether training or not
-        # use reshaping and shuffle axes to form input into flattened pools
-        x = np.reshape(x, (x.shape[0], self._shape[0], self._p_shape[0], self._shape[1], self._p_shape[1], self._shape[-1])) 
-        x = np.transpose(x, (0,1,3,2,4,5)) # form pools
-        x = np.reshape(x, (x.shape[0], self._shape[0], self._shape[1], -1, self._shape[-1])) # flatten pools
-
-        # create index of maximum values for each pool and cache if training
-        xi = np.expand_dims(np.argmax(x, 3), 3) 
-        self._maxpool_idx = xi if tr_flag else None
+        # build tables giving the flat input pixel of any pool position: pixel of position 0 of each pool, plus offset of each position
+        (h, w), (sh, sw), (ph, pw), (dh, dw) = prev._shape[:-1], self._stride, self._padding, self._dilation
+        self._pix_base = ((np.arange(self._shape[0]) * sh - ph)[:, None] * w + np.arange(self._shape[1]) * sw - pw)[:, :, None]
+        self._pix_offset = np.ravel((np.arange(self._p_shape[0]) * dh)[:, None] * w + np.arange(self._p_shape[1]) * dw)
+        self._overlap = np.any(np.less(self._stride, np.multiply(self._dilation, np.subtract(self._p_shape, 1)) + 1)) # whether pools overlap
 
-        return np.reshape(np.take_along_axis(x, xi, 3), (x.shape[0], -1)) # return activations
+    def _CalcActivations(self, x, tr_flag): # calculate activations; tr_flag specifies whether training or not
+        x = np.reshape(x, (x.shape[0],) + self._prev._shape) # unravel input images
+        a = np.full((x.shape[0],) + self._shape, -np.inf, x.dtype) # running maximum of each pool
+        xi = np.zeros(a.shape, self._idx_dtype) # running position of maximum of each pool
+        for k, xv, av, xiv in self._Views(x, a, xi): # visit each pool position, updating maxima (and their positions, if training)
+            if tr_flag and k > 0: # record k where this position has new maxima (positions are visited in increasing order, so k is
+                np.maximum(xiv, np.multiply(xv > av, k, dtype=self._idx_dtype), out=xiv) # greater than any earlier one)
+            np.maximum(av, xv, out=av)
+        self._maxpool_idx = xi if tr_flag else None # cache index of maximum values, if training
+        return np.reshape(a, (x.shape[0], -1)) # return activations
 
     # calculates cost derivative wrt inputs and passes this back through the network to adjust previous layers
-    def BackProp(self, da, params): 
-        dx = np.zeros((da.shape[0], self._shape[0], self._shape[1], self._p_shape[0] * self._p_shape[1], self._shape[2])) # dx = 0
-        da = np.reshape(da, self._maxpool_idx.shape) # unravel da completely (and add an extra dimension)
-        np.put_along_axis(dx, self._maxpool_idx, da, 3) # transfer da values into dx according to cached index
-        dx = np.reshape(dx, (da.shape[0], -1)) # reshape dx into mini-batch format
-        self._prev.BackProp(dx, params) # back-propagate cost derivative wrt to inputs (= activations of previous layer)
-
-    def Serialise(self): # convert layer to json data (ie a dict)
-        return OrderedDict([('p_shape', self._p_shape)])
+    def BackProp(self, da):
+        num, c, n_in = da.shape[0], self._shape[-1], self._prev._size
+        idx = np.take(self._pix_offset, self._maxpool_idx) # find flat input pixel of maximum of each pool
+        idx += self._pix_base
+        idx *= c # find flat position (within mini-batch) of each maximum
+        idx += np.arange(c)
+        idx += (np.arange(num) * n_in)[:, None, None, None]
+        if self._overlap: dx = np.bincount(idx.ravel(), da.ravel(), num * n_in).astype(da.dtype) # sum da's into dx (pools may share maxima)
+        else:
+            dx = np.zeros(num * n_in, da.dtype) # dx = 0
+            dx[idx.ravel()] = da.ravel() # transfer da values into dx according to cached index
+        self._prev.BackProp(np.reshape(dx, (num, -1))) # back-propagate cost derivative wrt to inputs (= activations of previous layer)
 
     @staticmethod
     def Deserialise(json_data, prev): # create maxpool layer from json layer data
-        return MaxPoolLayer(json_data['p_shape'], prev) 
-
-    def ToText(self): # convert layer attributes to display text
-        return 'shape={}, p_shape={}'.format(self._shape, self._p_shape)
+        return MaxPoolLayer(json_data['p_shape'], prev, json_data.get('stride'), json_data.get('padding', 0), json_data.get('dilation', 1))
@@ -1,10 +1,15 @@
 from collections import OrderedDict
 import json
+import os
+import numpy as np
 import InputLayer
 import ConvLayer
 import MaxPoolLayer
+import AvgPoolLayer
 import FullConLayer
 import OutputLayer
+import Optimizer
+from Weights_and_Biases import ParamBuffer
 
 class Network(): # implements network of layers; including saving and loading to file
     # map between json labels and corresponding layer classes
@@ -12,6 +17,8 @@ class Network(): # implements network of layers; including saving and loading to
         'input': InputLayer.InputLayer, 
         'conv': ConvLayer.ConvLayer,
         'maxpool': MaxPoolLayer.MaxPoolLayer,
+        'avgpool': AvgPoolLayer.AvgPoolLayer,
+        'global_avgpool': AvgPoolLayer.GlobalAvgPoolLayer,
         'full_con': FullConLayer.FullConLayer,
         'quad_output': OutputLayer.QuadOutputLayer,
         'xent_output': OutputLayer.XentOutputLayer,
@@ -19,42 +26,155 @@ class Network(): # implements network of layers; including saving and loading to
     }
     _map_to_json = { val: key for (key, val) in _map_from_json.items() }
 
-    # loads network from provided source (a json string or file)
-    def __init__(self, json_str=None, json_fn=None): 
-        if json_fn == None: network_data = json.loads(json_str) # load network into a dictionary from json string, otherwise...
+    # binary model format: magic bytes, header length (little-endian uint64), json header (network without weights and biases, 
+    # plus the payload dtype and offset), padding, then the flattened weights and biases (raw little-endian values, aligned)
+    _bin_magic = b'CNNBIN01'
+    _bin_align = 64
+
+    # loads network from provided source (a json string or file, or a binary file); dtype and master_weights override any values 
+    # in the file; weights in a binary file are memory-mapped using mmap_mode ('r' read-only, 'c' copy-on-write, None to load into RAM)
+    def __init__(self, json_str=None, json_fn=None, dtype=None, master_weights=None, bin_fn=None, mmap_mode='r'): 
+        if bin_fn != None: network_data = Network._ReadBinaryHeader(bin_fn) # load network architecture from binary file, otherwise...
+        elif json_fn == None: network_data = json.loads(json_str) # load network into a dictionary from json string, otherwise...
         else: 
             with open(json_fn) as f: network_data = json.load(f) # load network from json file
+        self.dtype = np.dtype(network_data.get('dtype', 'float64') if dtype == None else dtype) # compute dtype used by all layers
+        self._master = network_data.get('master_weights', False) if master_weights == None else master_weights # keep float64 master weights?
         self._first_layer, self._last_layer = None, None # initialise first and last layer pointers
+        self._opt = None # optimizer (created when first required)
+        self._num_accum = 0 # number of mini-batches with accumulated cost derivatives
         for layer_data in network_data['network']: # loop over each layer in the file
             layer_type = layer_data['layer'] # get the type of the next layer
             self._last_layer = self._map_from_json[layer_type].Deserialise(layer_data, self._last_layer) # create next layer
-            if self._first_layer == None: self._first_layer = self._last_layer # set first layer, if required
+            if self._first_layer == None: # set first layer (and the precision inherited by subsequent layers), if required
+                self._first_layer = self._last_layer 
+                self._first_layer.SetPrecision(self.dtype, self._master)
+        self.param_buf = ParamBuffer(self.Params()) # move all weights and biases into flat buffers
+        if bin_fn != None: self._LoadBinaryPayload(bin_fn, network_data['payload'], mmap_mode) # get weights and biases from binary file
+        else: 
+            for p in self.Params(): p.Init() # randomly initialise any weights and biases not loaded from json (in place, in flat buffers)
 
     def FeedForward(self, X): # feeds batch of input vectors forward through network; returns ultimate activations
         return self._first_layer.FeedForward(X, False)
 
-    def Train(self, X, Y_exp, params): # feeds forward batch of input vectors X; then back-propagates using expected output vectors Y_exp
-        self._first_layer.FeedForward(X, True) 
-        self._last_layer.BackProp(Y_exp, params) 
+    # feeds forward batch of input vectors X; then back-propagates using expected outputs Y_exp (output vectors or integer labels); 
+    # weights and biases are updated every params.accum_steps mini-batches (with cost derivatives accumulated in between); returns 
+    # output activations and mean cost (loss) over the mini-batch
+    def Train(self, X, Y_exp, params): 
+        a, loss = self.CalcGradients(X, Y_exp, params.label_smoothing) # calculate cost derivatives wrt all weights and biases
+        self.Accumulate(params)
+        return a, loss
 
-    def Save(self, fn): # saves network to file fn
+    # counts a mini-batch whose cost derivatives have been accumulated; updates all weights and biases every params.accum_steps 
+    # mini-batches
+    def Accumulate(self, params):
+        self._num_accum += 1 # count accumulated mini-batches
+        if self._num_accum >= params.accum_steps: self.GradDesc(params) # update all weights and biases, if required
+
+    # feeds forward batch of input vectors X; then back-propagates expected outputs Y_exp (output vectors or integer labels, with
+    # given label smoothing) to accumulate cost derivatives (no update); returns output activations and mean cost over the mini-batch
+    def CalcGradients(self, X, Y_exp, smoothing=0.0): 
+        a = self._first_layer.FeedForward(X, True) 
+        self._last_layer.BackProp(Y_exp, smoothing) 
+        return a, self._last_layer.loss
+
+    # prepares network for training: layers create what they otherwise create when first run (eg convolution engines, benchmarking
+    # 'auto' algorithms), so it isn't timed (or profiled) as part of the first training step, and ParallelTrainer's workers share it
+    def PrepareTraining(self):
+        layer = self._first_layer
+        while layer != None:
+            layer.Prepare()
+            layer = layer._next
+
+    def GradDesc(self, params): # updates all weights and biases with the optimizer given by params, using accumulated cost derivatives
+        if type(self._opt) is not Optimizer.map_from_name[params.optimizer]: # create optimizer if there isn't one or it has changed
+            self._opt = Optimizer.map_from_name[params.optimizer](self.param_buf)
+        self._opt.Step(params) # update weights and biases
+        self.ZeroGrad() # discard used cost derivatives
+
+    def GetTrainState(self): # returns snapshot (copies) of training state: weights and biases, accumulated derivatives and optimizer state
+        opt_t, opt_state = (0, []) if self._opt == None else self._opt.GetState()
+        return OrderedDict([('values', self.param_buf.Full().copy()), ('grad', self.param_buf.grad.copy()), 
+            ('num_grads', self.param_buf.NumGrads()), ('num_accum', self._num_accum), 
+            ('optimizer', Optimizer.map_to_name.get(type(self._opt))), ('opt_t', opt_t), ('opt_state', opt_state)])
+
+    def SetTrainState(self, state): # restores training state from snapshot given by GetTrainState
+        self.param_buf.Full()[...] = state['values'] # restore weights and biases
+        self.param_buf.Sync()
+        self.param_buf.grad[...] = state['grad'] # restore accumulated cost derivatives
+        for p in self.param_buf.params: p.num_grads = state['num_grads']
+        self._num_accum = state['num_accum']
+        self._opt = None if state['optimizer'] == None else Optimizer.map_from_name[state['optimizer']](self.param_buf) # restore optimizer
+        if self._opt != None: self._opt.SetState(state['opt_t'], state['opt_state'])
+
+    def ZeroGrad(self): # discards accumulated cost derivatives
+        for p in self.Params(): p.ZeroGrad()
+        self._num_accum = 0
+
+    def Params(self): # returns list of all weights and biases objects in the network (in layer order)
+        params = [] 
+        layer = self._first_layer # start with first layer
+        while layer != None: # loop until no more layers 
+            params += [p for p in (layer._w, layer._b) if p != None] # add layer's weights and biases, if it has them
+            layer = layer._next # get next layer
+        return params
+
+    def Serialise(self, with_weights=True): # converts network to json data (ie a dict), optionally without weights and biases
         network = [] # list used to store json data for each layer
         layer = self._first_layer # start with first layer
         while layer != None: # loop until no more layers 
             json_data = OrderedDict([('layer', self._map_to_json[layer.__class__])]) # serialise layer type
-            json_data.update(layer.Serialise()) # add serialised layer data
+            json_data.update(layer.Serialise(with_weights)) # add serialised layer data
             network.append(json_data) # add layer serialisation to network list
             layer = layer._next # get next layer
-        with open(fn, 'w') as f: json.dump(OrderedDict([('network', network)]), f) # label network list and write it to json file
+        return OrderedDict([('dtype', self.dtype.name), ('master_weights', self._master), ('network', network)]) # label network list
+
+    def Save(self, fn): # saves network to file fn
+        with open(fn, 'w') as f: json.dump(self.Serialise(), f) # write network to json file
+
+    def SaveBinary(self, fn): # saves network to file fn in binary model format
+        values = self.param_buf.Full() # get weights and biases at full available precision
+        dtype = values.dtype.newbyteorder('<') # payload is little-endian
+        network_data = self.Serialise(False) # get network architecture
+        network_data['payload'] = OrderedDict([('dtype', dtype.str), ('num', values.size), ('offset', 0)]) # describe payload
+        while True: # build header until payload offset is stable (header length, which sets the offset, depends on the offset)
+            header = json.dumps(network_data).encode('utf-8')
+            offset = -(-(len(Network._bin_magic) + 8 + len(header)) // Network._bin_align) * Network._bin_align # align payload
+            if offset == network_data['payload']['offset']: break
+            network_data['payload']['offset'] = offset
+        with open(fn, 'wb') as f: 
+            f.write(Network._bin_magic + len(header).to_bytes(8, 'little') + header) # write magic bytes and header
+            f.write(bytes(offset - f.tell())) # pad to payload offset
+            values.astype(dtype, copy=False).tofile(f) # write payload
+
+    @staticmethod
+    def _ReadBinaryHeader(fn): # reads header of binary model file; returns network data
+        with open(fn, 'rb') as f:
+            assert f.read(len(Network._bin_magic)) == Network._bin_magic, "Network; binary file format" # check magic bytes
+            size = int.from_bytes(f.read(8), 'little') # read header length
+            return json.loads(f.read(size).decode('utf-8')) # read header
+
+    def _LoadBinaryPayload(self, fn, payload, mmap_mode): # loads weights and biases from payload of binary model file
+        dtype, shape = np.dtype(payload['dtype']), (payload['num'],)
+        assert shape == self.param_buf.values.shape, "Network; binary file payload size"
+        assert os.path.getsize(fn) >= payload['offset'] + payload['num'] * dtype.itemsize, "Network; binary file truncated"
+        if mmap_mode == None: values = np.fromfile(fn, dtype, payload['num'], offset=payload['offset']) # load payload into RAM
+        else: values = np.memmap(fn, dtype, mmap_mode, payload['offset'], shape) # memory-map payload
+        if dtype == self.dtype and self.param_buf._master is None: self.param_buf.BindValues(values, False) # use payload as is (zero copy)
+        else: # otherwise convert payload (to full precision values, then to compute values)
+            self.param_buf.Full()[...] = values
+            self.param_buf.Sync()
+        for p in self.param_buf.params: p.initialised = True # (so values are kept if moved, eg into shared memory)
 
-    def Print(self): # print network model
+    def Print(self, profiler=None): # print network model (and table of per-layer timings, FLOPs and memory from profiler, if given)
         layer = self._first_layer # start with first layer
         num_params = 0 # counts number of trainable parameters
         while layer != None: # loop until no more layers 
             print('{}: {}'.format(self._map_to_json[layer.__class__], layer.ToText())) # print out layer description
             num_params += layer.num_params() # add number of parameters in layer
             layer = layer._next
-        print('(total params={:,})'.format(num_params))
+        print('(total params={:,}, dtype={}{})'.format(num_params, self.dtype.name, ', float64 master weights' if self._master else ''))
+        if profiler != None: print(profiler.ToText())
         
 
 
@@ -0,0 +1,80 @@
+import numpy as np
+
+# abstract class for optimizers; updates all weights and biases held in a (flat) parameter buffer in place using their accumulated 
+# cost derivatives; each update is a handful of in-place operations over the whole buffer
+class Optimizer(): 
+    def __init__(self, buf):
+        self._buf = buf # store parameter buffer to be updated
+        self._tmp = np.empty_like(buf.Full()) # scratch array (avoids allocating temporaries during updates)
+        self._state = self._InitState(buf.Full()) # preallocate optimizer state
+        self._t = 0 # number of update steps taken
+
+    # override these for derived classes
+    def _InitState(self, w): return () # returns tuple of state arrays for weights w
+    def _Update(self, w, g, state, tmp, params): pass # updates weights w in place given cost derivatives g, state and scratch array
+
+    def Step(self, params): # updates all weights and biases using provided hyper-parameters
+        self._t += 1 # count update step
+        w, g = self._buf.Full(), self._buf.grad # get weights at full precision (master copy, if there is one) and cost derivatives
+        num_grads = self._buf.NumGrads() 
+        if num_grads > 1: g *= 1 / num_grads # average accumulated cost derivatives
+        if params.L2 != 0: w[:self._buf.num_decay] *= 1 - params.eta * params.L2 # decay the weights (L2 regularisation), n/a to biases
+        self._Update(w, g, self._state, self._tmp, params) # update weights
+        self._buf.Sync() # refresh compute weights from master copy (if there is one)
+
+    def GetState(self): return self._t, [s.copy() for s in self._state] # returns (copy of) optimizer state for checkpointing
+
+    def SetState(self, t, state): # restores optimizer state from a checkpoint
+        self._t = t
+        for s, values in zip(self._state, state): s[...] = values
+
+class Momentum(Optimizer): # gradient descent with momentum: v = mu * v - eta * g; w = w + v
+    def _InitState(self, w): return (np.zeros_like(w),) # velocities
+    def _Update(self, w, g, state, tmp, params):
+        (vel,) = state
+        vel *= params.mu # decay velocities
+        vel -= np.multiply(g, params.eta, out=tmp) # update velocities using cost derivatives
+        w += vel # update weights using new velocities
+
+class Nesterov(Optimizer): # Nesterov accelerated gradient: v' = mu * v - eta * g; w = w - mu * v + (1 + mu) * v'
+    def _InitState(self, w): return (np.zeros_like(w),) # velocities
+    def _Update(self, w, g, state, tmp, params):
+        (vel,) = state
+        w -= np.multiply(vel, params.mu, out=tmp) # remove look-ahead applied with previous velocities
+        vel *= params.mu # decay velocities
+        vel -= np.multiply(g, params.eta, out=tmp) # update velocities using cost derivatives
+        w += np.multiply(vel, 1 + params.mu, out=tmp) # update weights, including look-ahead with new velocities
+
+class RMSProp(Optimizer): # RMSProp: s = beta2 * s + (1 - beta2) * g^2; w = w - eta * g / (sqrt(s) + eps)
+    def _InitState(self, w): return (np.zeros_like(w),) # running averages of squared cost derivatives
+    def _Update(self, w, g, state, tmp, params):
+        (sq,) = state
+        sq *= params.beta2 # decay running averages
+        sq += np.multiply(np.square(g, out=tmp), 1 - params.beta2, out=tmp) # add in new squared cost derivatives
+        np.sqrt(sq, out=tmp) # calculate denominator of update
+        tmp += params.eps
+        np.divide(g, tmp, out=tmp) # calculate update
+        w -= np.multiply(tmp, params.eta, out=tmp) # update weights
+
+class Adam(Optimizer): # Adam: bias-corrected running averages of cost derivatives (m) and their squares (s); w = w - eta * m / (sqrt(s) + eps)
+    def _InitState(self, w): return (np.zeros_like(w), np.zeros_like(w)) # running averages of cost derivatives and their squares
+    def _Update(self, w, g, state, tmp, params):
+        (m, sq) = state
+        m *= params.beta1 # decay running averages of cost derivatives
+        m += np.multiply(g, 1 - params.beta1, out=tmp) # add in new cost derivatives
+        sq *= params.beta2 # decay running averages of squared cost derivatives
+        sq += np.multiply(np.square(g, out=tmp), 1 - params.beta2, out=tmp) # add in new squared cost derivatives
+        np.sqrt(sq, out=tmp) # calculate (bias-corrected) denominator of update
+        tmp *= 1 / np.sqrt(1 - params.beta2 ** self._t)
+        tmp += params.eps
+        np.divide(m, tmp, out=tmp) # calculate update
+        w -= np.multiply(tmp, params.eta / (1 - params.beta1 ** self._t), out=tmp) # update weights (with bias-corrected learning rate)
+
+# maps between optimizer names (as used in hyper-parameters) and optimizer classes
+map_from_name = {
+    'momentum': Momentum,
+    'nesterov': Nesterov,
+    'rmsprop': RMSProp,
+    'adam': Adam
+    }
+map_to_name = { val: key for (key, val) in map_from_name.items() }
@@ -10,12 +10,29 @@ class OutputLayer(FullConLayer): # output layer of neurons; must be last layer n
         self._a = a if tr_flag else None # cache activations if training
         return a # return activations
 
+    # back-propagate given the expected outputs for the mini-batch: either output vectors, or integer labels (no dense one-hot 
+    # vectors are built); with label smoothing, the expected output for the label is 1 - smoothing, plus smoothing / nc for every class
+    # (derived classes calculate dz from a - y); the mean cost over the mini-batch is stored in loss
+    def BackProp(self, y_exp, smoothing=0.0): 
+        diff = self._Diff(y_exp, smoothing)
+        self.loss = self._Loss(y_exp, smoothing, diff) # calculate cost (before diff is overwritten)
+        super().BackProp(diff)
+
+    def _Loss(self, y_exp, smoothing, diff): return None # override to return mean cost given expected outputs (and a - y)
+
+    def _Diff(self, y_exp, smoothing): # returns activations minus expected outputs
+        if y_exp.ndim == 1: # integer labels: subtract 1 at each label (less smoothing), and smoothing / nc everywhere
+            diff = self._a - smoothing / self._size if smoothing else self._a.copy()
+            diff[np.arange(diff.shape[0]), y_exp] -= 1 - smoothing
+            return diff
+        diff = self._a - y_exp # output vectors
+        if smoothing: diff += smoothing * (y_exp - 1 / self._size) # (a - y') = (a - y) + smoothing * (y - 1/nc)
+        return diff
+
 class QuadOutputLayer(OutputLayer): # output layer that implements quadratic cost function: C(a) = 0.5 * (y - a)^2 
-    def __init__(self, size, af, prev): super().__init__(size, af, prev)
-    
-    def BackProp(self, y_exp, params): # back-propagate given the expected output vectors for the mini-batch
-        da = self._a - y_exp # calculate the cost derivatives wrt activations from the expected outputs
-        super().BackProp(da, params) # back-propagate using these derivatives
+    def __init__(self, size, af, prev): super().__init__(size, af, prev) # (cost derivatives wrt activations are a - y)
+
+    def _Loss(self, y_exp, smoothing, diff): return 0.5 * float(np.vdot(diff, diff)) / diff.shape[0] # mean quadratic cost
 
     @staticmethod
     def Deserialise(json_data, prev): # create quad output layer from json layer data
@@ -28,9 +45,14 @@ class QuadOutputLayer(OutputLayer): # output layer that implements quadratic cos
 class XentOutputLayer(OutputLayer): # output layer that implements cross entropy cost function: C(a) = y * ln(a) + (1 - y) * ln(1 - a)
     def __init__(self, size, af, prev): super().__init__(size, af, prev)
 
-    def _CalcDz(self, y_exp): # calculates cost derivatives wrt weighted inputs given expected outputs
-        if self._af is ActFunc.Sigmoid: return self._a - y_exp # shortcut for sigmoid activation function
-        return super()._CalcDz(np.divide(self._a - y_exp, self._af.phi_prime(self._a)))
+    def _CalcDz(self, diff): # calculates cost derivatives wrt weighted inputs given activations minus expected outputs
+        if self._af is ActFunc.Sigmoid: return diff # shortcut for sigmoid activation function
+        return super()._CalcDz(np.divide(diff, self._af.phi_prime(self._a)))
+
+    def _Loss(self, y_exp, smoothing, diff): # mean cross entropy cost (activations clipped to avoid ln(0))
+        eps = np.finfo(self._a.dtype).eps
+        a, y = np.clip(self._a, eps, 1 - eps), self._a - diff # (expected outputs, including smoothing)
+        return -float(np.sum(y * np.log(a) + (1 - y) * np.log1p(-a))) / a.shape[0]
 
     @staticmethod
     def Deserialise(json_data, prev): # create cross entropy output layer from json layer data
@@ -42,12 +64,28 @@ class XentOutputLayer(OutputLayer): # output layer that implements cross entropy
 class SoftmaxOutputLayer(OutputLayer): # output layer that implements log-likelihood cost function with softmax activation: C(a) = -ln(a) (for a expected to be 1.0)
     def __init__(self, size, prev): super().__init__(size, ActFunc.Softmax, prev)
 
-    def _CalcDz(self, y_exp): return self._a - y_exp # calculates cost derivatives wrt weighted inputs given expected outputs
+    # calculate activations; when training, log-softmax is calculated (in place, overflow-safe) and kept for the cost, and activations
+    # are its exponentials
+    def _CalcActivations(self, x, tr_flag): 
+        if not tr_flag: return super()._CalcActivations(x, tr_flag)
+        self._log_a = ActFunc.Softmax.log_phi_ip(x @ self._w.values, self._b.values)
+        return np.exp(self._log_a)
+
+    def _Loss(self, y_exp, smoothing, diff): # mean log-likelihood cost, from log-softmax (so finite even where activations underflow)
+        log_a, self._log_a = self._log_a, None
+        if y_exp.ndim == 1: # integer labels: cost is -ln(a) at label (less smoothing), and -smoothing / nc * ln(a) for every class
+            loss = -(1 - smoothing) * np.sum(log_a[np.arange(log_a.shape[0]), y_exp])
+            if smoothing: loss -= smoothing / self._size * np.sum(log_a)
+        else: loss = -np.vdot(log_a, y_exp + smoothing * (1 / self._size - y_exp)) # output vectors (smoothed)
+        return float(loss) / log_a.shape[0]
+
+    def _CalcDz(self, diff): return diff # cost derivatives wrt weighted inputs are activations minus expected outputs
 
-    def Serialise(self): # convert layer to json data (ie a dict)
+    def Serialise(self, with_weights=True): # convert layer to json data (ie a dict), optionally without weights and biases
         json_data = OrderedDict([('size', self._size)])
-        json_data.update(self._w.Serialise()) # serialise weights
-        json_data.update(self._b.Serialise()) # serialise biases
+        if with_weights: 
+            json_data.update(self._w.Serialise()) # serialise weights
+            json_data.update(self._b.Serialise()) # serialise biases
         return json_data
         
     @staticmethod
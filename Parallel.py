@@ -0,0 +1,97 @@
+import json
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from Network import Network
+from ConvLayer import ConvLayer
+
+class ParallelTrainer(): # data-parallel training; each mini-batch is split across worker processes that share the network's weights
+    def __init__(self, net, num_workers, max_batch):
+        self._net = net # store network being trained
+        self._num_workers = num_workers # store number of worker processes
+        self._max_batch = max_batch # store maximum mini-batch size
+        n, dtype = net.param_buf.values.size, net.dtype # total number of parameters and their dtype
+        in_size, out_size = net._first_layer._size, net._last_layer._size # input and output sizes of the network
+
+        # create shared memory blocks for parameter values, per-worker gradients and the mini-batch (inputs, expected and actual outputs)
+        self._shm = [shared_memory.SharedMemory(create=True, size=max(1, k * dtype.itemsize))
+            for k in (n, num_workers * n, max_batch * in_size, max_batch * out_size, max_batch * out_size)]
+        self._shapes = ((n,), (num_workers, n), (max_batch, in_size), (max_batch, out_size), (max_batch, out_size))
+        self._values, self._grads, self._X, self._Y, self._Y_hat = ParallelTrainer._Views(self._shm, self._shapes, dtype)
+        net.param_buf.BindValues(self._values) # move network weights into shared memory
+
+        # start worker processes, each with its own copy of the network (built without weights, which are shared)
+        net.PrepareTraining() # create conv engines (running the 'auto' benchmark) once, here
+        net_data = net.Serialise(False) # get network architecture
+        net_data['master_weights'] = False # workers only calculate gradients so don't need master weights
+        layer = net._first_layer
+        for layer_data in net_data['network']: # give workers the engines chosen here (so they don't benchmark, or choose differently)
+            if isinstance(layer, ConvLayer): layer_data['algo'] = layer.Algo()
+            layer = layer._next
+        ctx = mp.get_context() # get default multiprocessing context
+        self._conns, self._procs = [], []
+        for rank in range(num_workers): # create each worker, with a pipe for control messages
+            conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(target=ParallelTrainer._Worker, daemon=True,
+                args=(json.dumps(net_data), [s.name for s in self._shm], self._shapes, rank, child_conn))
+            proc.start()
+            self._conns.append(conn)
+            self._procs.append(proc)
+
+    # trains network on mini-batch (expected outputs Y_exp are output vectors or integer labels) by splitting it across workers,
+    # reducing gradients and updating (every params.accum_steps mini-batches); returns output activations and mean cost over the mini-batch
+    def Train(self, X, Y_exp, params): 
+        num = X.shape[0] # number of inputs in the mini-batch
+        assert num <= self._max_batch, "ParallelTrainer; mini-batch too large"
+        labels = Y_exp.ndim == 1 # whether expected outputs are integer labels (rather than output vectors)
+        self._X[:num] = X # copy mini-batch into shared memory (integer labels are held, exactly, in the first column of Y)
+        if labels: self._Y[:num, 0] = Y_exp
+        else: self._Y[:num] = Y_exp
+        bounds = np.linspace(0, num, self._num_workers + 1).astype(int) # split mini-batch into shards (one per worker)
+        shards = [(rank, lo, hi) for rank, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])) if hi > lo] # ignore empty shards
+        for rank, lo, hi in shards: self._conns[rank].send((lo, hi, num, labels, params.label_smoothing)) # start workers calculating gradients
+        loss = sum(self._conns[rank].recv() * (hi - lo) for rank, lo, hi in shards) / num # wait for workers to finish; weight their costs
+        buf, grads = self._net.param_buf, self._grads[[rank for rank, _, _ in shards]] # (weighted) gradients from workers
+        if buf.NumGrads() == 0: np.sum(grads, 0, out=buf.grad) # reduce gradients (first mini-batch overwrites any old values)
+        else: buf.grad += np.sum(grads, 0) # or accumulate them
+        for p in buf.params: p.num_grads += 1 # (so the optimizer averages over accumulated mini-batches)
+        self._net.Accumulate(params) # update shared weights (seen by workers) every params.accum_steps mini-batches
+        return self._Y_hat[:num].copy(), loss # return output activations calculated by workers, and cost
+
+    def FeedForward(self, X): return self._net.FeedForward(X) # feeds batch of input vectors forward through network
+
+    def PrepareTraining(self): self._net.PrepareTraining() # prepares network for training (already done when workers were started)
+
+    def Close(self): # shuts down workers and moves network weights out of shared memory
+        for conn in self._conns: conn.send(None) # tell workers to exit
+        for proc in self._procs: proc.join()
+        self._net.param_buf.BindValues(np.empty_like(self._values)) # give network private copy of weights
+        self._values = self._grads = self._X = self._Y = self._Y_hat = None # release views before closing shared memory
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.Close()
+
+    @staticmethod
+    def _Worker(net_str, shm_names, shapes, rank, conn): # worker process; calculates gradients for shards of mini-batches
+        net = Network(json_str=net_str) # create network
+        shm = [shared_memory.SharedMemory(name=name) for name in shm_names] # attach to shared memory blocks
+        values, grads, X, Y, Y_hat = ParallelTrainer._Views(shm, shapes, net.dtype)
+        net.param_buf.BindValues(values, False) # use shared weights
+        while True:
+            msg = conn.recv() # wait for next shard
+            if msg == None: break # exit if requested
+            lo, hi, num, labels, smoothing = msg
+            net.ZeroGrad() # discard previous gradients
+            y = Y[lo:hi, 0].astype(np.intp) if labels else Y[lo:hi] # get expected outputs
+            Y_hat[lo:hi], loss = net.CalcGradients(X[lo:hi], y, smoothing) # calculate gradients (averaged over shard), store outputs
+            np.multiply(net.param_buf.grad, (hi - lo) / num, out=grads[rank]) # weight gradients by shard size and store
+            conn.send(loss) # signal completion (with mean cost over shard)
+        values = grads = X = Y = Y_hat = net = None # release views before closing shared memory
+        for s in shm: s.close()
+
+    @staticmethod
+    def _Views(shm, shapes, dtype): return [np.ndarray(shape, dtype, buffer=s.buf) for s, shape in zip(shm, shapes)] # numpy views of shm
+
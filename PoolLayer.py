@@ -0,0 +1,39 @@
+import numpy as np
+from collections import OrderedDict
+from Layer import Layer
+import ConvEngine
+
+# abstract class for 2D pooling layers; pools are never gathered or transposed into copies: instead each pool position is visited in
+# turn through a strided view of the input (the part of the input that position covers) and the matching view of the output
+class PoolLayer(Layer):
+    # stride defaults to the pool shape; padding (on each side) never contributes to a pool; stride, padding and dilation may be
+    # pairs or single ints
+    def __init__(self, p_shape, prev, stride=None, padding=0, dilation=1):
+        self._p_shape = tuple(p_shape) # store pool shape as tuple
+        self._stride = self._p_shape if stride == None else ConvEngine.Pair(stride) # store stride
+        self._padding, self._dilation = ConvEngine.Pair(padding), ConvEngine.Pair(dilation) # store padding and dilation
+        geometry = (self._stride, self._padding, self._dilation)
+        shape = ConvEngine.ConvShape(prev._shape[:-1], self._p_shape, *geometry) + (prev._shape[-1],) # calculate shape of this layer
+        super().__init__(shape, None, prev) # call base initialiser
+
+        self._slices = ConvEngine.Col2ImSlices(prev._shape[:-1], self._p_shape, *geometry) # views of input and output for each pool position
+        self._count = np.zeros(self._shape[:-1] + (1,), int) # count number of input pixels in each pool
+        for dst, src in self._slices:
+            if dst != None: self._count[src] += 1
+        assert self._count.min() > 0 # check every pool covers some of the input
+
+    # yields (position, view of x, views of ys) for each pool position, given mini-batches of (unravelled) inputs x and outputs ys
+    def _Views(self, x, *ys): 
+        for k, (dst, src) in enumerate(self._slices):
+            if dst != None: yield (k, x[(slice(None),) + dst]) + tuple(y[(slice(None),) + src] for y in ys)
+
+    def Serialise(self, with_weights=True): # convert layer to json data (ie a dict)
+        json_data = OrderedDict([('p_shape', self._p_shape)])
+        # store pool geometry, if not defaults
+        for key, val, default in (('stride', self._stride, self._p_shape), ('padding', self._padding, (0, 0)), ('dilation', self._dilation, (1, 1))):
+            if val != default: json_data[key] = val
+        return json_data
+
+    def ToText(self): # convert layer attributes to display text
+        return 'shape={}, p_shape={}, stride={}, padding={}, dilation={}'.format(self._shape, self._p_shape, self._stride, self._padding,
+            self._dilation)
@@ -0,0 +1,116 @@
+import json
+import time
+import tracemalloc
+from collections import OrderedDict
+import numpy as np
+from ConvLayer import ConvLayer
+from FullConLayer import FullConLayer
+from PoolLayer import PoolLayer
+
+# opt-in per-layer profiler for a network; while started, the methods that do each layer's work (FeedForward, _CalcActivations,
+# BackProp, _CalcDerivatives) and the network's Train (a step) and GradDesc (the update of all weights and biases, which share flat
+# buffers) are wrapped to record wall time, FLOPs (estimated from layer shapes) and, optionally (using tracemalloc, which slows
+# numpy down), bytes allocated and peak memory of every call; when stopped the wrappers are removed, so there is no overhead at all
+#
+# times in the table are exclusive (calls nested in a call, eg FeedForward of the next layer, are subtracted); memory in the table
+# is from the non-recursive methods (_CalcActivations, _CalcDerivatives, GradDesc); every call is also recorded as an event in a
+# chrome trace (view with chrome://tracing or perfetto); only calls made on the thread that runs the network are supported, and
+# only calls in this process are seen (eg not those made by ParallelTrainer's workers)
+class Profiler():
+    _phases = OrderedDict([('FeedForward', 'forward'), ('_CalcActivations', 'forward'), ('BackProp', 'backward'),
+        ('_CalcDerivatives', 'backward')]) # layer methods wrapped, and phase each counts towards
+    _recursive = ('FeedForward', 'BackProp', 'Train') # methods that call (wrapped) methods of other layers
+
+    def __init__(self, net, memory=False):
+        self._net, self._memory = net, memory # store network and whether to trace memory
+        self.events = [] # chrome trace events of recorded calls
+        self._totals = OrderedDict() # totals of each layer (and the network): label -> { phase: [time, flops, bytes allocated, peak] }
+        self._stack = [] # frames [start time, time in nested calls, traced memory at start, peak memory] of calls in progress
+        self._wrapped = [] # (object, method name) of wrapped methods
+        self.num_steps = 0 # number of training steps recorded
+        self._t0 = time.perf_counter() # time origin of trace
+
+    def Start(self): # starts profiling (wraps methods)
+        layer, i = self._net._first_layer._next, 1 # (input layer does no work)
+        while layer != None:
+            label = '{} {}'.format(i, self._net._map_to_json[layer.__class__])
+            self._totals.setdefault(label, OrderedDict())
+            for name, phase in Profiler._phases.items(): self._Wrap(layer, name, label, phase, _Flops(layer, name))
+            layer, i = layer._next, i + 1
+        self._Wrap(self._net, 'Train', 'network', 'step')
+        self._Wrap(self._net, 'GradDesc', 'network', 'update')
+        if self._memory and not tracemalloc.is_tracing(): tracemalloc.start()
+        return self
+
+    def Stop(self): # stops profiling (removes wrappers)
+        for obj, name in self._wrapped: del obj.__dict__[name] # (uncovers class method)
+        self._wrapped = []
+        if self._memory and tracemalloc.is_tracing(): tracemalloc.stop()
+
+    def __enter__(self): return self.Start()
+    def __exit__(self, *args): self.Stop()
+
+    def SaveTrace(self, fn): # saves recorded calls to file fn as a chrome trace (json)
+        with open(fn, 'w') as f: json.dump(OrderedDict([('traceEvents', self.events), ('displayTimeUnit', 'ms')]), f)
+
+    def ToText(self): # returns table of time, FLOPs and memory of each layer (per training step, or totals if no steps were recorded)
+        n, mb = max(1, self.num_steps), 1 / 2**20
+        lines = ['{:<22}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}'.format('layer ({})'.format('per step' if self.num_steps else 'total'),
+            'fwd ms', 'bwd ms', 'upd ms', 'GFLOP', 'GFLOP/s', 'alloc MB', 'peak MB')]
+        for label, totals in self._totals.items():
+            t = [totals.get(phase, [0] * 4) for phase in ('forward', 'backward', 'update')]
+            secs, flops = sum(p[0] for p in t), sum(p[1] for p in t)
+            lines.append('{:<22}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.4f}{:>10.2f}{:>10.2f}{:>10.2f}'.format(label, t[0][0] / n * 1000,
+                t[1][0] / n * 1000, t[2][0] / n * 1000, flops / n / 1e9, flops / max(secs, 1e-12) / 1e9, sum(p[2] for p in t) / n * mb,
+                max(p[3] for p in t) * mb))
+        return '\n'.join(lines)
+
+    def _Wrap(self, obj, name, label, phase, flops=None): # wraps method name of obj (an instance attribute hides the class method)
+        method = getattr(obj, name)
+        recursive = name in Profiler._recursive
+        def Wrapper(*args):
+            self._Enter()
+            try: return method(*args)
+            finally: self._Exit(label, name, phase, 0 if flops == None else flops(*args), recursive)
+        setattr(obj, name, Wrapper)
+        self._wrapped.append((obj, name))
+
+    def _Enter(self): # starts recording a call
+        cur = 0
+        if self._memory:
+            cur, peak = tracemalloc.get_traced_memory()
+            if self._stack: self._stack[-1][3] = max(self._stack[-1][3], peak) # pass peak so far to calling frame
+            tracemalloc.reset_peak()
+        self._stack.append([time.perf_counter(), 0.0, cur, cur])
+
+    def _Exit(self, label, name, phase, flops, recursive): # finishes recording a call
+        t = time.perf_counter()
+        start, nested, cur, peak = self._stack.pop()
+        alloc = 0
+        if self._memory:
+            cur_end, peak_end = tracemalloc.get_traced_memory()
+            peak, alloc = max(peak, peak_end), cur_end - cur # peak memory and bytes allocated (and kept) by call
+            if self._stack: self._stack[-1][3] = max(self._stack[-1][3], peak) # pass peak to calling frame
+        if self._stack: self._stack[-1][1] += t - start # count time as nested in calling frame
+        self.events.append(OrderedDict([('name', name), ('cat', label), ('ph', 'X'), ('ts', (start - self._t0) * 1e6),
+            ('dur', (t - start) * 1e6), ('pid', 0), ('tid', 0), ('args', OrderedDict([('step', self.num_steps), ('flops', flops),
+            ('alloc', alloc), ('peak', peak - cur)]))]))
+        totals = self._totals.setdefault(label, OrderedDict()).setdefault(phase, [0.0, 0, 0, 0])
+        totals[0] += t - start - nested # exclusive time
+        totals[1] += flops
+        if not recursive:
+            totals[2] += alloc
+            totals[3] = max(totals[3], peak - cur)
+        if phase == 'step': self.num_steps += 1
+
+def _Flops(layer, name): # returns function estimating FLOPs of a call to layer's method name from its arguments (None if not counted)
+    if isinstance(layer, (FullConLayer, ConvLayer)): # multiply-adds of matmuls
+        k, d = int(np.prod(layer._w.values.shape[:-1])), layer._w.values.shape[-1] # inputs and outputs of each (output) position
+        p = layer._shape[0] * layer._shape[1] if isinstance(layer, ConvLayer) else 1 # number of positions
+        if name == '_CalcActivations': return lambda x, tr_flag: 2 * x.shape[0] * p * k * d
+        if name == '_CalcDerivatives': return lambda dz, x, no_dx=False: (2 if no_dx else 4) * x.shape[0] * p * k * d # dw (and dx)
+    if isinstance(layer, PoolLayer): # comparisons or additions for each pool position
+        n = layer._size * int(np.prod(layer._p_shape))
+        if name == '_CalcActivations': return lambda x, tr_flag: x.shape[0] * n
+        if name == 'BackProp': return lambda da: da.shape[0] * layer._size
+    return None
@@ -0,0 +1,109 @@
+import numpy as np
+import ConvEngine
+from Inference import InferencePlan
+
+# post-training int8 quantization: weights of fully connected (and output) and convolutional layers are quantized to int8 with a scale
+# for each output channel; each such layer's input is quantized to int8 with a single scale calibrated (from its maximum absolute value)
+# on a sample of a dataset; products are accumulated exactly as integers (as with int32 accumulation) and dequantized at layer outputs;
+# other layers run in the network's compute dtype; the plan takes a snapshot of the network's weights (so won't see later updates)
+#
+# nb, numpy has no int8 GEMM (integer matmul doesn't use BLAS, and is 10-30x slower), so integer matmuls are done by BLAS in float32,
+# on int8 weights widened once (when compiled); sums of up to _max_k int8 products are exactly representable in float32, so longer
+# sums are split into blocks of _max_k products whose (exact) partial sums are added in float64; either way the result equals int32
+# accumulation exactly; so quantization reproduces int8 inference, and shrinks the weights as stored (weight_bytes), but the plan 
+# runs at the speed, and holds weights in the memory (compute_bytes), of a float32 network
+_max_k = (2**24 - 1) // (127 * 127) # most int8 products summed exactly in float32
+
+class QuantizedPlan(InferencePlan):
+    # net: trained network; ds: dataset sampled (first num_calib items, in current order) to calibrate input scales
+    def __init__(self, net, ds, num_calib=1000, max_batch=256):
+        self._amax = Calibrate(net, ds, num_calib, max_batch) # maximum absolute input of each layer
+        self.weight_bytes = 0 # bytes of quantized (int8) weights, scales and biases
+        self.compute_bytes = 0 # bytes of weights (widened to float32), scales and biases used to run the plan
+        super().__init__(net, max_batch) # call base initialiser (compiles layer ops)
+
+    def _CompileFullCon(self, layer): # fully connected (and output) layers
+        wq, w_scale = QuantizeWeights(layer._w.values) # quantize weights
+        k, d = wq.shape
+        x_scale, w = self._InputScale(), self._Widen(wq) # get input scale and widened weights
+        scale, b = self._Scales(x_scale, w_scale, layer, wq, w) # scales to dequantize outputs, biases
+        xq = np.empty((self._max_batch, k), np.float32) # buffer for quantized inputs
+        z, zb = self._AccBuffers(k, self._max_batch, d) # buffers for accumulated products (if not in output) and partial sums
+        def op(x, out):
+            n = x.shape[0]
+            _Quantize(x, 1 / x_scale, xq[:n]) # quantize inputs
+            zz = out if z is None else z[:n]
+            _MatMul(xq[:n], w, zz, None if zb is None else zb[:n]) # accumulate integer products
+            np.multiply(zz, scale, out=out) # dequantize
+            layer._af.phi_ip(out, b) # add biases and apply activation function
+        return op
+
+    def _CompileConv(self, layer): # convolutional layers, using im2col with preallocated columns
+        prev, d = layer._prev, layer._shape[-1]
+        idx, valid = ConvEngine.BuildIdx(prev._shape[:-1], layer._f_shape, layer._stride, layer._padding, layer._dilation) # im2col index
+        (p, f), c = idx.shape, prev._shape[-1]
+        wq, w_scale = QuantizeWeights(np.reshape(np.transpose(layer._w.values, (1, 0, 2)), (f * c, d))) # quantize weights (ordered as columns)
+        x_scale, w = self._InputScale(), self._Widen(wq) # get input scale and widened weights
+        scale, b = self._Scales(x_scale, w_scale, layer, wq, w) # scales to dequantize outputs, biases
+        xq = np.empty((self._max_batch, prev._size), np.float32) # buffer for quantized inputs
+        cols = np.empty((self._max_batch, p, f, c), np.float32) # buffer for columns
+        z, zb = self._AccBuffers(f * c, self._max_batch * p, d) # buffers for accumulated products (if not in output) and partial sums
+        def op(x, out):
+            n = x.shape[0]
+            _Quantize(x, 1 / x_scale, xq[:n]) # quantize inputs
+            np.take(np.reshape(xq[:n], (n, -1, c)), idx, 1, cols[:n], 'clip') # apply im2col transform to quantized inputs
+            if valid is not None: cols[:n] *= valid[:, :, None] # zero padding
+            out = np.reshape(out, (n * p, d))
+            zz = out if z is None else z[:n * p]
+            _MatMul(np.reshape(cols[:n], (n * p, f * c)), w, zz, None if zb is None else zb[:n * p]) # accumulate integer products
+            np.multiply(zz, scale, out=out) # dequantize
+            layer._af.phi_ip(out, b) # add biases and apply activation function
+        return op
+
+    def _InputScale(self): # returns scale for quantizing input of layer being compiled (ops are compiled in order)
+        return max(self._amax[len(self._ops)], np.finfo(np.float32).tiny) / 127
+
+    def _Widen(self, wq): return wq.astype(np.float32) # returns int8 weights widened (once) for BLAS
+
+    # returns scales to dequantize outputs of layer (with given input and weight scales), and (a copy of) its biases; counts bytes of
+    # quantized and widened weights wq and w
+    def _Scales(self, x_scale, w_scale, layer, wq, w):
+        scale, b = (x_scale * w_scale).astype(self._dtype), layer._b.values.copy()
+        self.weight_bytes += wq.nbytes + scale.nbytes + b.nbytes
+        self.compute_bytes += w.nbytes + scale.nbytes + b.nbytes
+        return scale, b
+
+    # returns buffers for accumulating sums of k int8 products into (m, d) outputs: the accumulated products (float32, or float64 if 
+    # summed in blocks; None if they can be accumulated directly in the output) and the partial sums of a block (None if not needed)
+    def _AccBuffers(self, k, m, d):
+        acc = np.dtype(np.float32) if k <= _max_k else np.dtype(np.float64)
+        return None if acc == self._dtype else np.empty((m, d), acc), None if k <= _max_k else np.empty((m, d), np.float32)
+
+# calibrates network on the first num items of dataset ds; returns maximum absolute input of each layer (after the input layer)
+def Calibrate(net, ds, num=1000, max_batch=256):
+    plan = InferencePlan(net, max_batch)
+    amax = np.zeros(len(plan._ops))
+    def Observe(i, x): amax[i] = max(amax[i], np.max(np.abs(x)))
+    for start in range(0, min(num, ds.num), max_batch):
+        X, _ = ds.BuildMiniBatch(start, min(max_batch, num - start, ds.num - start))
+        plan._Run(X, Observe)
+    return amax
+
+def QuantizeWeights(w): # quantizes weights w (K, D) to int8 with a scale for each output channel (column); returns (int8 weights, scales)
+    scale = np.max(np.abs(w), 0).astype(np.float64) / 127
+    scale[scale == 0] = 1 # (any scale will do for all-zero channels)
+    return np.clip(np.rint(w / scale), -127, 127).astype(np.int8), scale
+
+# multiplies integers x (n, K) and w (K, D), held in float32, exactly into z (n, D); sums of more than _max_k products are split into 
+# blocks, each summed in zb (float32) then added to z
+def _MatMul(x, w, z, zb):
+    if zb is None: return np.matmul(x, w, out=z)
+    for lo in range(0, w.shape[0], _max_k):
+        np.matmul(x[:, lo : lo+_max_k], w[lo : lo+_max_k], out=zb)
+        if lo == 0: np.copyto(z, zb)
+        else: z += zb
+
+def _Quantize(x, inv_scale, out): # quantizes x (to integers in [-127, 127], held in out's dtype) using reciprocal of scale
+    np.multiply(x, inv_scale, out=out)
+    np.rint(out, out=out)
+    np.clip(out, -127, 127, out=out)
@@ -0,0 +1,49 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+try: from threadpoolctl import threadpool_limits # optional: used to limit BLAS threads so they don't oversubscribe the cores
+except ImportError: threadpool_limits = None
+
+# intra-op parallelism: work on a mini-batch (eg a conv layer's forward and backward passes) is split into chunks of items that run
+# at once on a persistent pool of threads (numpy releases the GIL in its kernels, so the chunks run in parallel); the number of
+# threads is set for the whole process; by default there is 1 thread (no splitting), so nothing changes unless it is set
+_num_threads = 1 # number of threads (including the calling thread)
+_pool = None # pool of num_threads - 1 threads (the calling thread runs the first chunk); created when first needed
+_limits = None # BLAS thread limit set with threads (restored when reset)
+_lock = threading.Lock() # guards creation of pool (Map may be called from several threads at once, eg by Evaluate)
+
+# sets number of threads used for intra-op parallelism; BLAS threads are limited to blas_threads (default: the cores shared between
+# the threads, so num_threads x BLAS threads doesn't exceed the cores), if threadpoolctl is available
+def SetNumThreads(num_threads, blas_threads=None):
+    global _num_threads, _pool, _limits
+    if _pool != None: _pool.shutdown()
+    if _limits != None: _limits.restore_original_limits()
+    _num_threads, _pool = max(1, num_threads), None
+    if blas_threads == None and _num_threads > 1: blas_threads = max(1, (os.cpu_count() or 1) // _num_threads)
+    _limits = None if threadpool_limits == None or blas_threads == None else threadpool_limits(blas_threads, 'blas')
+
+def NumThreads(): return _num_threads # returns number of threads used for intra-op parallelism
+
+# splits n items into chunks (lo, hi), one per thread, but none smaller than min_size items (so small mini-batches aren't split)
+def Chunks(n, min_size=8):
+    num = max(1, min(_num_threads, n // min_size))
+    bounds = [n * i // num for i in range(num + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def Map(fn, chunks): # calls fn(i, lo, hi) for each chunk i (lo, hi) at once, using the pool; returns list of results
+    global _pool
+    if len(chunks) == 1: return [fn(0, *chunks[0])]
+    with _lock:
+        if _pool == None: _pool = ThreadPoolExecutor(_num_threads - 1)
+        pool = _pool
+    futures = [pool.submit(fn, i, lo, hi) for i, (lo, hi) in enumerate(chunks) if i > 0]
+    return [fn(0, *chunks[0])] + [future.result() for future in futures] # (run first chunk on this thread)
+
+# a forked child (eg a ParallelTrainer worker) inherits the pool object but not its threads, so submitting work to it would wait
+# forever; the child drops it (without shutting it down, which would also wait) and creates its own when first needed (the lock is
+# replaced too, as it may have been held by another thread); n/a on Windows, which has no fork
+def _AfterFork():
+    global _pool, _lock
+    _pool, _lock = None, threading.Lock()
+
+if hasattr(os, 'register_at_fork'): os.register_at_fork(after_in_child=_AfterFork)
@@ -1,33 +1,82 @@
 import numpy as np
 
-class Weights(): # implements gradient descent for weights with L2 regularisation and momentum
-    def __init__(self, shape, sigma):
-        self.values = np.random.normal(0, sigma, shape) # create weights using random values from normal distribution
-        self._vel = np.zeros(shape) # initialise corresponding velocities matrix to 0s
+# holds weights (and their accumulated cost derivatives) for a layer; subject to L2 regularisation; values are allocated but not 
+# initialised until loaded, or randomly initialised by Init (so no random values are drawn for weights that are then loaded)
+class Weights(): 
+    decay = True # whether L2 regularisation applies
 
-    def GradDesc(self, dw, params): # adjust weights using gradient descent and provided parameters, given cost derivatives wrt to weights
-        self._vel = params.mu * self._vel - dw * params.eta # update velocities for weights using cost derivatives
-        self.values *= 1 - params.eta * params.L2 # decay the weights (L2 regularisation)
-        self.values += self._vel # update weights using new velocities
+    def __init__(self, shape, sigma, dtype=np.float64, master=False):
+        self._sigma = sigma # store sigma of normal distribution used to initialise weights
+        self.values = np.empty(shape, dtype) # weights in compute dtype
+        self._master = np.empty(shape, np.float64) if master and self.values.dtype != np.float64 else None # float64 master copy of weights, if requested
+        self.grad = None # cost derivatives wrt weights (accumulated by back propagation; bound to a view of a flat buffer by ParamBuffer)
+        self.num_grads = 0 # number of cost derivatives accumulated in grad
+        self.initialised = False # whether values have been loaded or initialised
+
+    def Init(self): # initialises weights using random values from normal distribution (unless already loaded)
+        if not self.initialised: self._Load(np.random.normal(0, self._sigma, self.values.shape))
+
+    def AddGrad(self, dw): # accumulates cost derivatives wrt weights
+        if self.num_grads == 0: np.copyto(self.grad, dw) # first derivatives overwrite any old values
+        else: self.grad += dw 
+        self.num_grads += 1
+
+    def ZeroGrad(self): self.num_grads = 0 # discards accumulated cost derivatives
+
+    def Full(self): return self.values if self._master is None else self._master # returns weights at full available precision
 
     def Serialise(self): # return weights encoded as json data
-        return { 'weights': np.reshape(self.values, self.values.size).tolist() }
+        return { 'weights': np.reshape(self.Full(), self.values.size).tolist() }
 
     def Deserialise(self, json_data): # initialise weight values from json data, if it is present
-        if 'weights' in json_data: self.values = np.reshape(np.array(json_data['weights']), self._vel.shape)
+        if 'weights' in json_data: self._Load(json_data['weights'])
+
+    def _Load(self, data): # load weight values (in place) from (flat) data, keeping dtype and any master copy
+        values = np.reshape(np.array(data, dtype=np.float64), self.values.shape)
+        self.values[...] = values
+        if self._master is not None: self._master[...] = values
+        self.initialised = True
 
     def num_params(self): return np.prod(self.values.shape) # return the total number of weights
 
-class Biases(Weights): # implements gradient descent for biases with momentum
-    def __init__(self, shape): super().__init__(shape, 1) # call base initialiser (without any scaling)
+class Biases(Weights): # holds biases (and their accumulated cost derivatives) for a layer
+    decay = False # regularisation is n/a to biases
 
-    def GradDesc(self, db, params): # adjust biases using gradient descent and provided parameters, given cost derivatives wrt to biases
-        params = params._replace(L2=0) # regularisation is n/a to biases
-        super().GradDesc(db, params) # call base implementation
+    def __init__(self, shape, dtype=np.float64, master=False): super().__init__(shape, 1, dtype, master) # call base initialiser (without any scaling)
 
     def Serialise(self): # return biases encoded as json data
-        return { 'biases': np.reshape(self.values, self.values.size).tolist() }
+        return { 'biases': np.reshape(self.Full(), self.values.size).tolist() }
 
     def Deserialise(self, json_data): # initialise bias values from json data, if it is present
-        if 'biases' in json_data: self.values = np.reshape(np.array(json_data['biases']), self._vel.shape)
+        if 'biases' in json_data: self._Load(json_data['biases'])
+
+# holds the values, cost derivatives and any master copy of a list of weights/biases objects in contiguous flat buffers; the objects
+# are given views into these buffers; weights are placed before biases so that regularisation applies to a single slice
+class ParamBuffer(): 
+    def __init__(self, params):
+        self.params = sorted(params, key=lambda p: not p.decay) # store weights/biases objects (weights first)
+        sizes = [p.values.size for p in self.params] # get number of values in each weights/biases object
+        self._offsets = np.cumsum([0] + sizes) # offset of each weights/biases object in the buffers
+        self.num_decay = int(sum(size for p, size in zip(self.params, sizes) if p.decay)) # number of values subject to regularisation
+        dtype = self.params[0].values.dtype if self.params else np.float64 # compute dtype
+        self.values = self._Bind(np.empty(self._offsets[-1], dtype), 'values') # move values into flat buffer
+        self.grad = self._Bind(np.zeros(self._offsets[-1], dtype), 'grad', False) # create cost derivatives in flat buffer (untouched until training)
+        has_master = any(p._master is not None for p in self.params) # check for master copies of weights
+        self._master = self._Bind(np.empty(self._offsets[-1], np.float64), '_master') if has_master else None
+
+    def BindValues(self, flat, copy=True): self.values = self._Bind(flat, 'values', copy) # moves values into given flat buffer (eg shared memory)
+
+    def Full(self): return self.values if self._master is None else self._master # returns values at full available precision
+
+    def Sync(self): # refreshes compute values from master copy (if there is one) after an update
+        if self._master is not None: np.copyto(self.values, self._master, casting='same_kind') 
+
+    def NumGrads(self): return max((p.num_grads for p in self.params), default=0) # returns number of accumulated cost derivatives
 
+    # makes given attribute of each weights/biases object a view of flat (copying current values in, for initialised objects)
+    def _Bind(self, flat, attr, copy=True): 
+        for p, lo, hi in zip(self.params, self._offsets[:-1], self._offsets[1:]):
+            view = flat[lo:hi].reshape(p.values.shape)
+            if copy and p.initialised: view[...] = getattr(p, attr)
+            setattr(p, attr, view)
+        return flat
@@ -0,0 +1,31 @@
+import os
+import numpy as np
+import pytest
+from Network import Network
+from HyperParameters import HyperParameters
+from Checkpoint import Checkpointer
+import Checkpoint
+from Main import mnist_net_str
+from projects.Mnist.Mnist import Mnist
+
+def _Setup():
+    rng = np.random.default_rng(0)
+    ds = Mnist(rng.integers(0, 256, (100, 28, 28), np.uint8), rng.integers(0, 10, 100).astype(np.uint8), seed=0)
+    return Network(json_str=mnist_net_str), ds, HyperParameters(batch_size=10)
+
+def test_save_and_resume(tmp_path):
+    net, ds, params = _Setup()
+    fn = str(tmp_path / 'checkpoint.npz')
+    with Checkpointer(fn) as checkpointer: checkpointer.Save(net, ds, params, 2, 30)
+    net2, params2, epoch, start = Checkpoint.Resume(fn, ds)
+    assert (epoch, start) == (2, 30) and params2 == params and np.array_equal(net2.param_buf.values, net.param_buf.values)
+
+# a failed write is raised on the training thread (by the next Save, and by Close, which doesn't wait on the stopped writer)
+def test_write_error(tmp_path):
+    net, ds, params = _Setup()
+    checkpointer = Checkpointer(str(tmp_path / 'missing' / 'checkpoint.npz'))
+    checkpointer.Save(net, ds, params, 0, 0)
+    checkpointer._thread.join(10)
+    assert not checkpointer._thread.is_alive()
+    with pytest.raises(FileNotFoundError): checkpointer.Save(net, ds, params, 0, 10)
+    with pytest.raises(FileNotFoundError): checkpointer.Close()
@@ -0,0 +1,14 @@
+import json
+import pytest
+from Network import Network
+
+def _Net(f_shape, dilation=1):
+    return Network(json_str=json.dumps({ 'dtype': 'float32', 'network': [{ 'layer': 'input', 'shape': [28, 28, 1] },
+        { 'layer': 'conv', 'f_shape': f_shape, 'depth': 4, 'act_func': 'relu', 'padding': 'same', 'dilation': dilation }]}))
+
+# 'same' padding keeps the input size for odd (dilated) filter extents; even ones (needing asymmetric padding) are rejected
+def test_same_padding():
+    for f_shape, dilation in (([3, 3], 1), ([5, 3], 1), ([3, 3], 2), ([2, 2], 2)):
+        assert _Net(f_shape, dilation)._last_layer._shape == (28, 28, 4)
+    for f_shape in ([4, 4], [3, 2]):
+        with pytest.raises(AssertionError): _Net(f_shape)
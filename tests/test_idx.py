@@ -0,0 +1,21 @@
+import os
+import gzip
+import numpy as np
+from Idx import LoadIdx
+
+def _Write(fn, data): # writes uint8 array as gzip compressed IDX file
+    with gzip.open(fn, 'wb') as f:
+        f.write(bytes([0, 0, 0x08, data.ndim]) + b''.join(s.to_bytes(4, 'big') for s in data.shape) + data.tobytes())
+
+# files of the same name in different directories (eg MNIST and Fashion-MNIST) sharing a cache directory each get their own cache
+def test_cache_per_source(tmp_path):
+    rng, cache_dir, arrays = np.random.default_rng(0), str(tmp_path / 'cache'), []
+    for name in ('a', 'b'):
+        os.makedirs(str(tmp_path / name))
+        data = rng.integers(0, 256, (5, 4, 3), np.uint8)
+        _Write(str(tmp_path / name / 'train-images-idx3-ubyte.gz'), data)
+        arrays.append(data)
+    for _ in range(2): # (build caches, then reuse them)
+        for name, data in zip(('a', 'b'), arrays):
+            fn = str(tmp_path / name / 'train-images-idx3-ubyte.gz')
+            assert np.array_equal(LoadIdx(fn, cache_dir), data) and np.array_equal(LoadIdx(fn), data)
@@ -0,0 +1,36 @@
+import json
+import asyncio
+import numpy as np
+from Network import Network
+from InferenceServer import InferenceServer
+from Main import mnist_net_str
+
+# sends http request with given content-length header and body to server; returns status code and json data of response
+async def _Request(port, length, body=b''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write('POST /predict HTTP/1.1\r\nContent-Length: {}\r\n\r\n'.format(length).encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''): break
+        key, _, val = line.decode('latin-1').partition(':')
+        headers[key.strip().lower()] = val.strip()
+    data = json.loads(await reader.readexactly(int(headers['content-length'])))
+    writer.close()
+    return status, data
+
+def test_content_length():
+    async def Main():
+        net = Network(json_str=mnist_net_str)
+        server = InferenceServer(net, port=0, max_body=100000)
+        await server.Start()
+        try:
+            body = json.dumps({ 'inputs': np.zeros((2, 784)).tolist() }).encode('utf-8')
+            status, data = await _Request(server.port, len(body), body)
+            assert status == 200 and len(data['labels']) == 2
+            assert (await _Request(server.port, 100001))[0] == 413
+            for length in ('-1', 'abc', '1e3', ''): assert (await _Request(server.port, length))[0] == 400
+        finally: await server.Stop()
+    asyncio.run(Main())
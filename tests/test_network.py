@@ -0,0 +1,24 @@
+import os
+import json
+import numpy as np
+import pytest
+from Network import Network
+
+def _Net(size, dtype='float32'):
+    return Network(json_str=json.dumps({ 'dtype': dtype, 'network': [{ 'layer': 'input', 'shape': [size] },
+        { 'layer': 'full_con', 'size': size, 'act_func': 'relu' }, { 'layer': 'softmax_output', 'size': 10 }]}))
+
+# layer sizes change the header's length, and so where it crosses the alignment boundaries that set the payload offset
+@pytest.mark.parametrize('size', list(range(1, 130)) + [1000, 12345])
+def test_binary_round_trip(tmp_path, size):
+    net, fn = _Net(size), str(tmp_path / 'net.bin')
+    net.SaveBinary(fn)
+    for mmap_mode in (None, 'r'):
+        net2 = Network(bin_fn=fn, mmap_mode=mmap_mode)
+        assert np.array_equal(net2.param_buf.values, net.param_buf.values)
+
+def test_binary_truncated(tmp_path):
+    net, fn = _Net(20), str(tmp_path / 'net.bin')
+    net.SaveBinary(fn)
+    with open(fn, 'r+b') as f: f.truncate(os.path.getsize(fn) - 4)
+    with pytest.raises(AssertionError): Network(bin_fn=fn)
@@ -0,0 +1,83 @@
+import os
+import sys
+import subprocess
+
+# each test runs a script in a fresh interpreter (from the repository root, where the modules are), with a timeout, so that a
+# deadlock between worker processes fails the test rather than hanging the run
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _Run(script, timeout=300):
+    res = subprocess.run([sys.executable, '-c', script], cwd=_root, capture_output=True, text=True, timeout=timeout)
+    assert res.returncode == 0, res.stderr
+    assert res.stdout.strip().endswith('ok'), res.stdout
+
+_setup = '''
+import json
+import numpy as np
+import Threads
+from Network import Network
+from Parallel import ParallelTrainer
+from HyperParameters import HyperParameters
+from Main import mnist_net_str
+
+net = Network(json_str=mnist_net_str, dtype='float64')
+ref = Network(json_str=json.dumps(net.Serialise())) # identical copy, trained in this process for reference
+rng = np.random.default_rng(0)
+X, y = rng.random((64, net._first_layer._size)), rng.integers(0, 10, 64)
+'''
+
+# intra-op threads used in the parent before ParallelTrainer forks its workers (which then use threads of their own)
+def test_threads_with_workers():
+    _Run(_setup + '''
+Threads.SetNumThreads(4)
+net.FeedForward(X) # starts the thread pool before the fork
+trainer, params = ParallelTrainer(net, 2, 64), HyperParameters(batch_size=64)
+res = [trainer.Train(X, y, params) for _ in range(2)]
+trainer.Close()
+Threads.SetNumThreads(1)
+res_ref = [ref.Train(X, y, params) for _ in range(2)]
+for (a, loss), (a_ref, loss_ref) in zip(res, res_ref): assert np.allclose(a, a_ref) and np.isclose(loss, loss_ref)
+assert np.allclose(net.param_buf.values, ref.param_buf.values)
+print('ok')
+''')
+
+# gradients accumulated over several mini-batches before each update, as when training in a single process
+def test_accum_steps():
+    _Run(_setup + '''
+trainer, params = ParallelTrainer(net, 2, 32), HyperParameters(batch_size=32, accum_steps=3)
+for i in range(7): # (ends part way through accumulating)
+    trainer.Train(X[i % 2 * 32:][:32], y[i % 2 * 32:][:32], params)
+    ref.Train(X[i % 2 * 32:][:32], y[i % 2 * 32:][:32], params)
+    assert np.allclose(net.param_buf.values, ref.param_buf.values)
+trainer.Close()
+assert net._num_accum == ref._num_accum == 1 and np.allclose(net.param_buf.grad, ref.param_buf.grad)
+print('ok')
+''')
+
+# conv engines are created (and 'auto' engines chosen) before workers start, without pinning the choice in the saved network
+def test_engines_prepared():
+    _Run(_setup + '''
+from ConvLayer import ConvLayer
+trainer = ParallelTrainer(net, 2, 64)
+convs = [layer for layer in (net._first_layer, net._first_layer._next, net._first_layer._next._next) if isinstance(layer, ConvLayer)]
+assert convs and all(layer._engines for layer in convs)
+assert all('algo' not in layer_data for layer_data in net.Serialise(False)['network'])
+trainer.Close()
+print('ok')
+''')
+
+# weights of a network loaded from a binary model file are moved into shared memory (and back again) intact
+def test_binary_loaded():
+    _Run(_setup + '''
+import os, tempfile
+fn = os.path.join(tempfile.mkdtemp(), 'net.bin')
+net.SaveBinary(fn)
+net = Network(bin_fn=fn)
+trainer, params = ParallelTrainer(net, 2, 64), HyperParameters(batch_size=64)
+assert np.array_equal(net.param_buf.values, ref.param_buf.values)
+trainer.Train(X, y, params)
+trainer.Close()
+ref.Train(X, y, params)
+assert np.allclose(net.param_buf.values, ref.param_buf.values)
+print('ok')
+''')
@@ -0,0 +1,28 @@
+import json
+import numpy as np
+import Quantize
+from Network import Network
+
+# integer matmuls (in float32, in blocks when the sums could exceed float32's exact range) equal int32 accumulation exactly
+def test_matmul_exact():
+    rng = np.random.default_rng(0)
+    for k in (100, Quantize._max_k, 3000):
+        x, w = rng.integers(-127, 128, (20, k)), rng.integers(-127, 128, (k, 30))
+        z = np.empty((20, 30), np.float32 if k <= Quantize._max_k else np.float64)
+        zb = None if k <= Quantize._max_k else np.empty((20, 30), np.float32)
+        Quantize._MatMul(x.astype(np.float32), w.astype(np.float32), z, zb)
+        assert np.array_equal(z, np.matmul(x, w, dtype=np.int32))
+
+def test_plan():
+    np.random.seed(0)
+    net = Network(json_str=json.dumps({ 'dtype': 'float32', 'network': [{ 'layer': 'input', 'shape': [12, 12, 1] },
+        { 'layer': 'conv', 'f_shape': [3, 3], 'depth': 8, 'act_func': 'relu', 'padding': 'same' },
+        { 'layer': 'full_con', 'size': 50, 'act_func': 'relu' }, { 'layer': 'softmax_output', 'size': 10 }]}))
+    X = np.random.default_rng(0).random((100, 144)).astype(np.float32)
+    class Data(): # calibration data
+        num = 100
+        def BuildMiniBatch(self, start, num): return X[start : start+num], None
+    plan = Quantize.QuantizedPlan(net, Data(), 100, 50)
+    Y, Y_q = net.FeedForward(X), np.concatenate([plan.PredictProba(X[i : i+50]) for i in (0, 50)])
+    assert np.abs(Y - Y_q).max() < 0.01 and np.mean(np.argmax(Y, 1) == np.argmax(Y_q, 1)) > 0.9
+    assert plan.weight_bytes < plan.compute_bytes < net.param_buf.values.nbytes * 1.1
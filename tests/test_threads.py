@@ -0,0 +1,30 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+import Threads
+
+# Map called from several threads at once (eg by Evaluate) creates a single pool
+def test_pool_created_once(monkeypatch):
+    created = []
+    class Executor(Threads.ThreadPoolExecutor):
+        def __init__(self, *args):
+            time.sleep(0.05) # (widen window for a race)
+            created.append(self)
+            super().__init__(*args)
+    monkeypatch.setattr(Threads, 'ThreadPoolExecutor', Executor)
+    Threads.SetNumThreads(2)
+    try:
+        threads = [threading.Thread(target=Threads.Map, args=(lambda i, lo, hi: hi - lo, [(0, 8), (8, 16)])) for _ in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+    finally: Threads.SetNumThreads(1)
+    assert len(created) == 1
+
+# Threads (and so the network) can be imported where there is no fork (eg Windows)
+def test_import_without_fork():
+    script = 'import os\ndel os.register_at_fork\nimport Threads, Network\nprint("ok")'
+    res = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True, text=True, timeout=120)
+    assert res.stdout.strip() == 'ok', res.stderr